@@ -0,0 +1,53 @@
+"""
+Configuração do Gunicorn para produção.
+
+    gunicorn -c gunicorn.conf.py projeto_trainee.wsgi
+
+Workers e threads vêm de variáveis de ambiente para serem ajustados a partir
+dos tempos de inicialização e das métricas (/store/metricas). Para servir as
+rotas assíncronas use GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker e
+projeto_trainee.asgi:application; nesse perfil o streaming (?stream=1) responde
+400, então mantenha um servidor WSGI para ele.
+"""
+
+import multiprocessing
+import os
+import time
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+# Cada thread mantém uma conexão persistente: workers x threads <= max_connections do PostgreSQL
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+# Recicla os workers aos poucos para limitar vazamentos de memória
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = 500
+accesslog = '-'
+
+_inicio = {}
+
+
+def on_starting(server):
+    _inicio['mestre'] = time.perf_counter()
+
+
+def when_ready(server):
+    server.log.info('Tempo de inicialização do mestre: %.3fs', time.perf_counter() - _inicio['mestre'])
+
+
+def post_fork(server, worker):
+    worker.inicio_boot = time.perf_counter()
+
+
+def post_worker_init(worker):
+    # Tempo para carregar o Django e a aplicação dentro do worker
+    worker.log.info('Worker %s pronto em %.3fs', worker.pid, time.perf_counter() - worker.inicio_boot)
+
+
+def worker_exit(server, worker):
+    # Envia as métricas que ainda estão na memória do worker antes de ele sair
+    from store import metricas
+    metricas.enviar()
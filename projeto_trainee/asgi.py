@@ -2,6 +2,8 @@
 ASGI config for projeto_trainee project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Streaming responses (?stream=1) are WSGI-only and answer 400 here; see
+store.streaming.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -38,10 +38,12 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'django_celery_beat',
     'store'
 ]
 
 MIDDLEWARE = [
+    'store.middleware.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -132,7 +134,95 @@ STATIC_ROOT = '/app/staticfiles'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://redis:6379/1',
+    }
+}
+
+# Cache dos comandos benchmark_*, em outro banco do Redis: eles limpam o
+# cache inteiro e não podem apagar nem misturar os dados da aplicação
+CACHE_BENCHMARK = {
+    'BACKEND': 'django_redis.cache.RedisCache',
+    'LOCATION': 'redis://redis:6379/2',
+}
+
+# Tempo (em segundos) que produtos e páginas da listagem ficam no cache
+CACHE_PRODUTOS_TTL = 300
+
 CELERY_BROKER_URL = 'redis://redis:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
-CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
\ No newline at end of file
+CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
+
+# Tarefas periódicas (celery beat). O agendamento fica no banco (django-celery-beat)
+# para que as campanhas de desconto possam agendar a ativação e a expiração
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    'expirar-reservas': {
+        'task': 'store.tasks.expirar_reservas',
+        'schedule': 60.0,
+    },
+    'rebalancear-faixas-estoque': {
+        'task': 'store.tasks.rebalancear_faixas_estoque',
+        'schedule': 30.0,
+    },
+    # Garante o processamento se a tarefa agendada pelo checkout assíncrono se perder
+    'processar-compras-pendentes': {
+        'task': 'store.tasks.processar_compras_pendentes',
+        'schedule': 60.0,
+    },
+    # As campanhas têm tarefas no horário de início e fim; esta cobre as que se perderem
+    'atualizar-campanhas': {
+        'task': 'store.tasks.atualizar_campanhas',
+        'schedule': 60.0,
+    },
+}
+
+REST_FRAMEWORK = {
+    # JSON com orjson; o navegável do DRF continua disponível no navegador
+    'DEFAULT_RENDERER_CLASSES': [
+        'store.renderers.OrjsonRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Paginação por cursor das listagens da API
+PAGINACAO_TAMANHO_PADRAO = 50
+PAGINACAO_TAMANHO_MAXIMO = 500
+
+# Linhas lidas do banco por vez nas listagens em streaming (?stream=1)
+STREAMING_TAMANHO_LOTE = 2000
+
+# Quantidade de produtos atualizados por update na tarefa atualizar_desconto
+DESCONTO_TAMANHO_LOTE = 1000
+
+# Quantidade de produtos gravados por transação na importação em lote
+IMPORTACAO_TAMANHO_LOTE = 5000
+
+# Threads (e conexões com o banco) usadas pelas views assíncronas de cada processo
+ASYNC_THREADS_BANCO = 8
+
+# Tempo (em segundos) que a quantidade de um item do carrinho fica reservada no estoque
+RESERVA_TTL_SEGUNDOS = 15 * 60
+
+# Itens do carrinho liberados por transação na expiração das reservas
+RESERVA_TAMANHO_LOTE = 1000
+
+# Checkout assíncrono: espera para juntar as compras em um lote e máximo de compras por lote
+CHECKOUT_JANELA_LOTE_SEGUNDOS = 0.5
+CHECKOUT_TAMANHO_LOTE = 500
+
+# Máximo de candidatos lidos por tipo de busca (texto e trigramas) antes de ordenar por relevância
+BUSCA_MAXIMO_CANDIDATOS = 1000
+
+# De quanto em quanto tempo cada worker soma as métricas das requisições aos contadores no Redis
+METRICAS_INTERVALO_ENVIO_SEGUNDOS = 5
+
+# Respostas guardadas para as repetições com o mesmo Idempotency-Key (compras e carrinho)
+IDEMPOTENCIA_TTL_SEGUNDOS = 24 * 60 * 60
+# Quanto uma repetição simultânea espera pela resposta da primeira antes de responder 409
+IDEMPOTENCIA_ESPERA_SEGUNDOS = 10
+# Validade da trava da primeira requisição, caso o processo morra no meio
+IDEMPOTENCIA_TRAVA_SEGUNDOS = 60
@@ -0,0 +1,37 @@
+"""
+Configurações de produção.
+
+    DJANGO_SETTINGS_MODULE=projeto_trainee.settings_producao gunicorn -c gunicorn.conf.py projeto_trainee.wsgi
+
+Os valores sensíveis vêm de variáveis de ambiente (ver docker-compose.producao.yml).
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+
+# Com DEBUG desligado o Django não guarda as queries executadas na memória
+DEBUG = False
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost').split(',')
+
+DATABASES['default'].update({
+    'NAME': os.environ.get('POSTGRES_DB', DATABASES['default']['NAME']),
+    'USER': os.environ.get('POSTGRES_USER', DATABASES['default']['USER']),
+    'PASSWORD': os.environ.get('POSTGRES_PASSWORD', DATABASES['default']['PASSWORD']),
+    'HOST': os.environ.get('POSTGRES_HOST', DATABASES['default']['HOST']),
+    # Conexões persistentes: cada thread do servidor reaproveita a sua
+    # conexão por até CONN_MAX_AGE segundos em vez de abrir uma por requisição
+    'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 300)),
+})
+
+# Testa (SELECT 1) as conexões paradas há mais de N segundos antes de usar
+CONN_VERIFICACAO_INTERVALO = int(os.environ.get('CONN_VERIFICACAO_INTERVALO', 30))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'root': {'handlers': ['console'], 'level': 'INFO'},
+}
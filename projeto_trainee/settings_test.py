@@ -0,0 +1,31 @@
+"""
+Configurações usadas para rodar os testes localmente, sem Docker.
+
+    python manage.py test --settings=projeto_trainee.settings_test
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    }
+}
+
+CELERY_BROKER_URL = 'memory://'
+CELERY_RESULT_BACKEND = 'cache+memory://'
+CELERY_TASK_ALWAYS_EAGER = True
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # O padrão (300) descarta chaves; as métricas usam alguns milhares, como no Redis
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+}
+CACHE_BENCHMARK = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'benchmark',
+    'OPTIONS': {'MAX_ENTRIES': 100000},
+}
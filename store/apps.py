@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.core.signals import request_finished, request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        from store.busca import criar_indices
+        from store.conexoes import marcar_uso, verificar_conexoes
+        from store.middleware import instalar_medicao
+        post_migrate.connect(criar_indices, sender=self)
+        connection_created.connect(instalar_medicao)
+        request_started.connect(verificar_conexoes)
+        request_finished.connect(marcar_uso)
@@ -0,0 +1,43 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from store.conexoes import marcar_uso, verificar_conexoes
+
+_pool = None
+
+
+def pool_banco():
+    """
+    Pool de threads limitado onde as views assíncronas fazem o acesso ao banco
+
+    Cada thread mantém a sua conexão (reaproveitada com CONN_MAX_AGE), então o
+    número de conexões abertas pelo processo nunca passa de ASYNC_THREADS_BANCO.
+    """
+
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=getattr(settings, 'ASYNC_THREADS_BANCO', 8), thread_name_prefix='store-banco')
+    return _pool
+
+
+def _executar(funcao, args, kwargs):
+    # Faz o que os sinais request_started/request_finished fazem nas views síncronas
+    close_old_connections()
+    verificar_conexoes()
+    try:
+        return funcao(*args, **kwargs)
+    finally:
+        close_old_connections()
+        marcar_uso()
+
+
+async def no_banco(funcao, *args, **kwargs):
+    """
+    Roda funcao(*args, **kwargs) no pool do banco sem bloquear o event loop
+    """
+
+    contexto = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool_banco(), contexto.run, _executar, funcao, args, kwargs)
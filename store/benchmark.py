@@ -0,0 +1,118 @@
+import json
+import math
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from store.dados_sinteticos import gerar, DadosJaGerados
+
+
+def percentil(valores, p):
+    """
+    Percentil pelo método do posto mais próximo (valores já ordenados)
+    """
+
+    if not valores:
+        return None
+    posto = max(1, math.ceil(p / 100 * len(valores)))
+    return valores[posto - 1]
+
+
+def resumir(latencias, consultas=None, duracao=None):
+    """
+    Resume as latências (em segundos) em milissegundos e requisições por segundo
+    """
+
+    latencias = sorted(latencias)
+    duracao = duracao if duracao is not None else sum(latencias)
+    resumo = {
+        'n': len(latencias),
+        'p50_ms': round(percentil(latencias, 50) * 1000, 3),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 3),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 3),
+        'media_ms': round(sum(latencias) / len(latencias) * 1000, 3),
+        'req_por_s': round(len(latencias) / duracao, 2) if duracao else None,
+    }
+    if consultas is not None:
+        resumo['queries_media'] = round(sum(consultas) / len(consultas), 2)
+        resumo['queries_max'] = max(consultas)
+    return resumo
+
+
+def medir(funcao, repeticoes, preparar=None):
+    """
+    Chama funcao() repetidas vezes medindo a latência e as queries de cada chamada
+
+    preparar(i), se informado, roda antes de cada chamada e fica fora da medição.
+    Levanta AssertionError se alguma chamada responder com erro.
+    """
+
+    latencias = []
+    consultas = []
+    for i in range(repeticoes):
+        argumentos = preparar(i) if preparar else ()
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            response = funcao(*argumentos)
+            latencias.append(time.perf_counter() - inicio)
+        if response is not None and response.status_code >= 400:
+            raise AssertionError(f'Resposta {response.status_code}: {getattr(response, "data", response.content[:200])}')
+        consultas.append(len(capturadas))
+    return resumir(latencias, consultas)
+
+
+def comparar(atual, base):
+    """
+    Diferença percentual de p50, p95 e queries entre dois resultados
+    """
+
+    linhas = []
+    for nome, resumo in atual['cenarios'].items():
+        anterior = base.get('cenarios', {}).get(nome)
+        if not anterior:
+            continue
+        linha = {'cenario': nome}
+        for campo in ('p50_ms', 'p95_ms', 'queries_media'):
+            if anterior.get(campo):
+                linha[campo] = round((resumo[campo] - anterior[campo]) / anterior[campo] * 100, 1)
+        linhas.append(linha)
+    return linhas
+
+
+def salvar(resultado, caminho):
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+
+
+def carregar(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+@contextmanager
+def banco_de_teste(tamanhos, manter=False, log=None):
+    """
+    Cria um banco de teste separado, popula com dados sintéticos e apaga no final
+
+    Com manter=True o banco fica para a próxima execução e os dados já gerados
+    com a mesma semente são reaproveitados. O cache também é separado
+    (CACHE_BENCHMARK): as versões do catálogo, as respostas de Idempotency-Key
+    e as métricas da aplicação não são lidas nem apagadas pelo benchmark, e o
+    cache.clear() dos comandos só limpa o cache do benchmark.
+    """
+
+    log = log or (lambda mensagem: None)
+    nome_original = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=manter)
+    try:
+        with override_settings(CACHES={'default': settings.CACHE_BENCHMARK}):
+            cache.clear()
+            try:
+                gerar(log=lambda mensagem: log(f'Gerado: {mensagem}'), **tamanhos)
+            except DadosJaGerados:
+                log('Reaproveitando os dados já gerados no banco de teste')
+            yield
+    finally:
+        connection.creation.destroy_test_db(nome_original, verbosity=0, keepdb=manter)
@@ -0,0 +1,134 @@
+import re
+from difflib import SequenceMatcher
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from store.models import Produto
+
+CONFIGURACAO_TEXTO = 'portuguese'
+
+# A expressão tem que ser a mesma do índice para o PostgreSQL usá-lo
+VETOR_PRODUTO = f"to_tsvector('{CONFIGURACAO_TEXTO}'::regconfig, coalesce(nome, '') || ' ' || coalesce(descricao, ''))"
+
+INDICES_POSTGRES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    f'CREATE INDEX IF NOT EXISTS produto_busca_texto_idx ON {{tabela}} USING gin (({VETOR_PRODUTO}))',
+    'CREATE INDEX IF NOT EXISTS produto_nome_trgm_idx ON {tabela} USING gin (nome gin_trgm_ops)',
+]
+
+
+def termos(texto):
+    """
+    Palavras da busca, em minúsculas e sem pontuação
+    """
+
+    return re.findall(r'\w+', (texto or '').lower())
+
+
+def consulta_prefixo(palavras):
+    """
+    tsquery em que cada palavra casa também como prefixo ('cami' encontra 'camiseta')
+    """
+
+    return ' & '.join(f'{palavra}:*' for palavra in palavras)
+
+
+def criar_indices(**kwargs):
+    """
+    Cria a extensão pg_trgm e os índices GIN da busca (só no PostgreSQL)
+
+    Conectado ao post_migrate, já que os índices são de expressões que o
+    SQLite usado nos testes não suporta.
+    """
+
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for sql in INDICES_POSTGRES:
+            cursor.execute(sql.format(tabela=Produto._meta.db_table))
+
+
+def _buscar_postgres(palavras, texto, limite, candidatos):
+    """
+    Junta os resultados da busca textual (com prefixo) e da busca por trigramas
+    (tolerante a erros de digitação) e ordena todos pela mesma pontuação
+
+    Cada busca para em candidatos linhas, sem ordenar, direto dos índices GIN;
+    ordenar pelo rank antes do LIMIT calcularia o rank de todas as linhas que
+    casam, quase a tabela inteira para prefixos curtos. Só os candidatos são
+    pontuados: semelhança do nome com o texto (0 a 1) mais o ts_rank_cd
+    normalizado (0 a 1, zero para quem só veio dos trigramas), então um nome
+    bem parecido pode passar na frente de uma ocorrência fraca na descrição.
+    """
+
+    tabela = Produto._meta.db_table
+    consulta = f"to_tsquery('{CONFIGURACAO_TEXTO}', %s)"
+    sql = f'''
+        SELECT id FROM {tabela}
+        WHERE id IN (
+            (SELECT id FROM {tabela} WHERE {VETOR_PRODUTO} @@ {consulta} LIMIT %s)
+            UNION
+            (SELECT id FROM {tabela} WHERE %s <%% nome LIMIT %s)
+        )
+        ORDER BY word_similarity(%s, nome) + ts_rank_cd({VETOR_PRODUTO}, {consulta}, 32) DESC, id
+        LIMIT %s
+    '''
+    prefixo = consulta_prefixo(palavras)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [prefixo, candidatos, texto, candidatos, texto, prefixo, limite])
+        return [linha[0] for linha in cursor.fetchall()]
+
+
+def _relevancia(palavras, texto, nome, descricao):
+    nome = nome.lower()
+    descricao = descricao.lower()
+    pontos = sum(2 if palavra in nome else 1 if palavra in descricao else 0 for palavra in palavras)
+    return pontos + SequenceMatcher(None, texto, nome).ratio()
+
+
+def _buscar_fallback(palavras, texto, limite, candidatos):
+    """
+    Busca para o SQLite: icontains em nome/descrição e, sem resultados,
+    semelhança de texto (difflib) com os nomes. Serve para rodar e testar
+    localmente, não para catálogos grandes.
+    """
+
+    filtro = Q()
+    for palavra in palavras:
+        filtro &= Q(nome__icontains=palavra) | Q(descricao__icontains=palavra)
+    linhas = list(Produto.objects.filter(filtro).values_list('id', 'nome', 'descricao')[:candidatos])
+
+    if linhas:
+        pontuados = [(_relevancia(palavras, texto, nome, descricao), produto_id) for produto_id, nome, descricao in linhas]
+    else:
+        pontuados = []
+        for produto_id, nome in Produto.objects.values_list('id', 'nome').iterator():
+            semelhanca = max(SequenceMatcher(None, palavra, parte).ratio() for palavra in palavras for parte in termos(nome) or [''])
+            if semelhanca >= 0.75:
+                pontuados.append((semelhanca, produto_id))
+
+    pontuados.sort(key=lambda item: (-item[0], str(item[1])))
+    return [produto_id for _, produto_id in pontuados[:limite]]
+
+
+def buscar_produtos(texto, limite=20):
+    """
+    Busca produtos por nome e descrição, ordenados por relevância
+
+    Aceita prefixos ('cami') e pequenos erros de digitação ('camizeta').
+    Retorna a lista de produtos na ordem da relevância.
+    """
+
+    palavras = termos(texto)
+    if not palavras:
+        return []
+    texto = ' '.join(palavras)
+    candidatos = getattr(settings, 'BUSCA_MAXIMO_CANDIDATOS', 1000)
+
+    if connection.vendor == 'postgresql':
+        ids = _buscar_postgres(palavras, texto, limite, candidatos)
+    else:
+        ids = _buscar_fallback(palavras, texto, limite, candidatos)
+
+    produtos = Produto.objects.in_bulk(ids)
+    return [produtos[produto_id] for produto_id in ids if produto_id in produtos]
@@ -0,0 +1,199 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# Muda a cada alteração em qualquer produto (listagem)
+CHAVE_VERSAO_CATALOGO = 'store:versao:catalogo'
+# Muda quando todos os produtos são invalidados de uma vez
+CHAVE_VERSAO_PRODUTOS = 'store:versao:produtos'
+# Muda quando o nome ou o preço de algum produto pode ter mudado (as compras mostram esses campos)
+CHAVE_VERSAO_CADASTRO = 'store:versao:cadastro'
+# Muda a cada compra criada ou alterada
+CHAVE_VERSAO_COMPRAS = 'store:versao:compras'
+CHAVE_ACERTOS = 'store:cache:acertos'
+CHAVE_FALHAS = 'store:cache:falhas'
+
+# Versões de linhas (produto ou compra) expiram depois de um dia sem mudar;
+# se expirar, a próxima leitura cria uma versão nova e o cliente só perde um 304
+TTL_VERSAO_LINHA = 24 * 60 * 60
+
+
+def chave_versao_produto(produto_id):
+    return f'store:versao:produto:{produto_id}'
+
+
+def chave_versao_compra(compra_id):
+    return f'store:versao:compra:{compra_id}'
+
+
+def _ttl_versao(chave):
+    if chave.startswith(('store:versao:produto:', 'store:versao:compra:')):
+        return TTL_VERSAO_LINHA
+    return None
+
+
+def chave_produto(produto_id, versoes):
+    return f'store:produto:{produto_id}:' + ':'.join(str(versao) for versao in versoes)
+
+
+def _ttl():
+    return getattr(settings, 'CACHE_PRODUTOS_TTL', 300)
+
+
+def _incrementar(chave, inicial=1):
+    try:
+        return cache.incr(chave)
+    except ValueError:
+        if cache.add(chave, inicial, timeout=None):
+            return inicial
+        return cache.incr(chave)
+
+
+def _agora():
+    return time.time_ns() // 1000
+
+
+def versao(chave):
+    """
+    Versão atual de uma chave, criada na primeira leitura
+
+    As versões são timestamps em microssegundos, então continuam crescendo
+    mesmo se o Redis perder a chave e servem de Last-Modified nas respostas.
+    """
+
+    atual = cache.get(chave)
+    if atual is None:
+        cache.add(chave, _agora(), timeout=_ttl_versao(chave))
+        atual = cache.get(chave)
+    return atual
+
+
+def versoes(chaves):
+    """
+    Versões de várias chaves com uma ida só ao cache
+    """
+
+    valores = cache.get_many(chaves)
+    return [valores[chave] if chave in valores else versao(chave) for chave in chaves]
+
+
+def nova_versao(chave):
+    """
+    Avança a versão para o timestamp atual (ou +1, se o relógio não andou)
+    """
+
+    nova = max(_agora(), (cache.get(chave) or 0) + 1)
+    cache.set(chave, nova, timeout=None)
+    return nova
+
+
+def versoes_produto(produto_id):
+    return versoes([CHAVE_VERSAO_PRODUTOS, chave_versao_produto(produto_id)])
+
+
+def versao_catalogo():
+    return versao(CHAVE_VERSAO_CATALOGO)
+
+
+def versoes_compra(compra_id):
+    return versoes([chave_versao_compra(compra_id), CHAVE_VERSAO_CADASTRO])
+
+
+def versoes_compras():
+    return versoes([CHAVE_VERSAO_COMPRAS, CHAVE_VERSAO_CADASTRO])
+
+
+def ler_ou_carregar(chave, carregar):
+    """
+    Busca a chave no cache e, se não tiver, chama carregar() e guarda o resultado
+
+    Retorna o valor e se foi um acerto de cache.
+    """
+
+    valor = cache.get(chave)
+    if valor is not None:
+        _incrementar(CHAVE_ACERTOS)
+        return valor, True
+
+    _incrementar(CHAVE_FALHAS)
+    valor = carregar()
+    cache.set(chave, valor, timeout=_ttl())
+    return valor, False
+
+
+def resumo_parametros(parametros):
+    return hashlib.md5(parametros.encode()).hexdigest()
+
+
+def ler_produto(produto_id, versoes, carregar):
+    """
+    Cache de um produto, versionado pela versão do produto (versoes_produto)
+    """
+
+    return ler_ou_carregar(chave_produto(produto_id, versoes), carregar)
+
+
+def ler_lista_produtos(parametros, versao, carregar):
+    """
+    Cache das páginas da listagem, versionado pelo catálogo inteiro
+    """
+
+    chave = f'store:produtos:{versao}:{resumo_parametros(parametros)}'
+    return ler_ou_carregar(chave, carregar)
+
+
+def _invalidar(produto_ids, cadastro):
+    # As entradas antigas deixam de ser lidas e expiram pelo TTL
+    agora = _agora()
+    cache.set_many({chave_versao_produto(produto_id): agora for produto_id in produto_ids}, timeout=TTL_VERSAO_LINHA)
+    nova_versao(CHAVE_VERSAO_CATALOGO)
+    if cadastro:
+        nova_versao(CHAVE_VERSAO_CADASTRO)
+
+
+def invalidar_produtos(produto_ids, cadastro=True):
+    """
+    Invalida o cache dos produtos e das páginas da listagem
+
+    Dentro de uma transação a invalidação só acontece depois do commit, para
+    que uma leitura concorrente não volte a guardar os dados antigos.
+    cadastro=False indica que só estoque ou desconto mudaram, então as compras
+    (que mostram nome e preço dos produtos) continuam válidas.
+    """
+
+    produto_ids = list(produto_ids)
+    transaction.on_commit(lambda: _invalidar(produto_ids, cadastro))
+
+
+def invalidar_todos_produtos():
+    """
+    Invalida todos os produtos, para alterações em massa sem a lista de ids
+    """
+
+    def invalidar():
+        nova_versao(CHAVE_VERSAO_PRODUTOS)
+        _invalidar([], cadastro=True)
+    transaction.on_commit(invalidar)
+
+
+def invalidar_compras(compra_ids):
+    """
+    Muda a versão das compras alteradas e da listagem de compras (depois do commit)
+    """
+
+    compra_ids = list(compra_ids)
+
+    def invalidar():
+        cache.set_many({chave_versao_compra(compra_id): _agora() for compra_id in compra_ids}, timeout=TTL_VERSAO_LINHA)
+        nova_versao(CHAVE_VERSAO_COMPRAS)
+    transaction.on_commit(invalidar)
+
+
+def estatisticas():
+    valores = cache.get_many([CHAVE_ACERTOS, CHAVE_FALHAS])
+    return {
+        'acertos': valores.get(CHAVE_ACERTOS, 0),
+        'falhas': valores.get(CHAVE_FALHAS, 0),
+    }
@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models import Max, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django_celery_beat.models import ClockedSchedule, PeriodicTask
+from store.cache import invalidar_todos_produtos
+from store.models import CampanhaDesconto, Produto
+from store.precos import recalcular_precos
+
+TAREFA = 'store.tasks.atualizar_campanhas'
+
+
+def _vigentes(agora):
+    return Q(inicio__lte=agora, fim__gt=agora)
+
+
+def aplicar_descontos(produtos):
+    """
+    Recalcula desconto_campanha e preco_final de um queryset de produtos
+
+    São dois updates para todos os produtos de uma vez: o desconto de campanha
+    é o maior entre as campanhas ativas de cada produto (0 se não houver) e o
+    preço final sai dele e do desconto do produto.
+    """
+
+    Vinculo = CampanhaDesconto.produtos.through
+    maior = (
+        Vinculo.objects
+        .filter(produto_id=OuterRef('pk'), campanhadesconto__ativa=True)
+        .values('produto_id')
+        .annotate(maior=Max('campanhadesconto__desconto'))
+        .values('maior')
+    )
+    produtos.update(desconto_campanha=Coalesce(Subquery(maior), Value(0)))
+    recalcular_precos(produtos)
+    invalidar_todos_produtos()
+
+
+def atualizar_campanhas(agora=None):
+    """
+    Ativa as campanhas que começaram e expira as que terminaram
+
+    Pode rodar quantas vezes for preciso: só as campanhas cujo estado mudou
+    são tocadas. Retorna quantas campanhas mudaram.
+    """
+
+    agora = agora or timezone.now()
+    vigentes = _vigentes(agora)
+
+    with transaction.atomic():
+        mudaram = list(
+            CampanhaDesconto.objects
+            .select_for_update()
+            .filter((vigentes & Q(ativa=False)) | (~vigentes & Q(ativa=True)))
+            .values_list('id', flat=True)
+        )
+        if not mudaram:
+            return 0
+
+        CampanhaDesconto.objects.filter(vigentes, pk__in=mudaram).update(ativa=True)
+        CampanhaDesconto.objects.filter(pk__in=mudaram).exclude(vigentes).update(ativa=False)
+        aplicar_descontos(Produto.objects.filter(campanhas__in=mudaram))
+
+    return len(mudaram)
+
+
+def _nome_tarefa(campanha, momento):
+    return f'campanha-{campanha.pk}-{momento}'
+
+
+def agendar(campanha):
+    """
+    Agenda no beat (django-celery-beat) a ativação e a expiração da campanha
+
+    Cada uma é uma tarefa de execução única no horário de início e de fim.
+    """
+
+    for momento, horario in (('inicio', campanha.inicio), ('fim', campanha.fim)):
+        if horario <= timezone.now():
+            continue
+        relogio, _ = ClockedSchedule.objects.get_or_create(clocked_time=horario)
+        PeriodicTask.objects.update_or_create(
+            name=_nome_tarefa(campanha, momento),
+            defaults={'task': TAREFA, 'clocked': relogio, 'one_off': True, 'enabled': True},
+        )
+
+
+def cancelar(campanha):
+    """
+    Desativa a campanha, tira o desconto dos produtos e remove os agendamentos
+    """
+
+    with transaction.atomic():
+        produtos = Produto.objects.filter(pk__in=list(campanha.produtos.values_list('id', flat=True)))
+        PeriodicTask.objects.filter(name__in=[_nome_tarefa(campanha, 'inicio'), _nome_tarefa(campanha, 'fim')]).delete()
+        campanha.delete()
+        aplicar_descontos(produtos)
@@ -0,0 +1,70 @@
+class CamposInvalidos(ValueError):
+    pass
+
+
+def ler_campos(request, esquema):
+    """
+    Lê ?fields= (ex.: id,nome,itens.quantidade) e monta a árvore dos campos pedidos
+
+    esquema é {campo: subesquema ou None} com os campos que a rota devolve.
+    Na árvore, None em um campo quer dizer ele inteiro ('itens' é o item com
+    todos os campos, 'itens.quantidade' só a quantidade). Sem ?fields=
+    retorna None, que é tudo.
+    """
+
+    texto = request.query_params.get('fields')
+    if texto is None:
+        return None
+
+    arvore = {}
+    for caminho in texto.split(','):
+        caminho = caminho.strip()
+        if not caminho:
+            continue
+
+        partes = caminho.split('.')
+        no = arvore
+        nivel = esquema
+        for indice, parte in enumerate(partes):
+            if not isinstance(nivel, dict) or parte not in nivel:
+                raise CamposInvalidos(f'Campo inválido em fields: {caminho}')
+            nivel = nivel[parte]
+            if indice == len(partes) - 1:
+                no[parte] = None
+            elif no.get(parte, {}) is None:
+                # O campo inteiro já foi pedido
+                break
+            else:
+                no = no.setdefault(parte, {})
+
+    if not arvore:
+        raise CamposInvalidos('Informe os campos em fields')
+    return arvore
+
+
+def quer(campos, nome):
+    return campos is None or nome in campos
+
+
+def subcampos(campos, nome):
+    return None if campos is None else campos.get(nome)
+
+
+def selecionados(campos, nomes):
+    """
+    Os nomes pedidos, na ordem de nomes
+    """
+
+    return tuple(nome for nome in nomes if quer(campos, nome))
+
+
+def podar(dados, campos):
+    """
+    Tira de um dicionário (ou lista de dicionários) o que não foi pedido
+    """
+
+    if campos is None:
+        return dados
+    if isinstance(dados, list):
+        return [podar(linha, campos) for linha in dados]
+    return {nome: podar(valor, campos[nome]) for nome, valor in dados.items() if nome in campos}
@@ -0,0 +1,63 @@
+from uuid import UUID
+from store.models import Produto
+from store.reservas import reservar
+
+
+def _erro(produto_id, quantidade, mensagem):
+    return {'produto_id': produto_id, 'quantidade': quantidade, 'status': 'erro', 'message': mensagem}
+
+
+def atualizar_carrinho(cliente, linhas):
+    """
+    Aplica várias linhas {produto_id, quantidade} no carrinho de uma vez
+
+    A quantidade é a nova quantidade do produto no carrinho e 0 remove o item.
+    As quantidades são reservadas no estoque (store.reservas), com um update
+    condicional por produto, e os itens gravados com um upsert e um delete.
+    Retorna o resultado de cada linha, na mesma ordem.
+    """
+
+    resultados = [None] * len(linhas)
+    validas = {}
+
+    for indice, linha in enumerate(linhas):
+        if not isinstance(linha, dict):
+            resultados[indice] = _erro(None, None, 'Linha inválida')
+            continue
+
+        produto_id = linha.get('produto_id')
+        quantidade = linha.get('quantidade')
+
+        try:
+            produto_uuid = UUID(str(produto_id))
+        except ValueError:
+            resultados[indice] = _erro(produto_id, quantidade, 'Produto não encontrado')
+            continue
+
+        if not isinstance(quantidade, int) or isinstance(quantidade, bool) or quantidade < 0:
+            resultados[indice] = _erro(produto_id, quantidade, 'A quantidade deve ser um inteiro maior ou igual a 0')
+            continue
+
+        if produto_uuid in validas:
+            resultados[indice] = _erro(produto_id, quantidade, 'Produto repetido no lote')
+            continue
+
+        validas[produto_uuid] = (indice, quantidade)
+
+    faixas = dict(Produto.objects.filter(pk__in=validas).values_list('id', 'faixas_estoque'))
+    for produto_id in list(validas):
+        if produto_id not in faixas:
+            indice, quantidade = validas.pop(produto_id)
+            resultados[indice] = _erro(str(produto_id), quantidade, 'Produto não encontrado')
+
+    reservados = reservar(cliente, {produto_id: quantidade for produto_id, (_, quantidade) in validas.items()}, faixas=faixas)
+
+    for produto_id, (indice, quantidade) in validas.items():
+        if reservados[produto_id] is None:
+            resultados[indice] = _erro(str(produto_id), quantidade, 'Estoque insuficiente')
+        elif quantidade == 0:
+            resultados[indice] = {'produto_id': str(produto_id), 'quantidade': 0, 'status': 'removido'}
+        else:
+            resultados[indice] = {'produto_id': str(produto_id), 'quantidade': quantidade, 'status': 'atualizado'}
+
+    return resultados
@@ -0,0 +1,124 @@
+from collections import defaultdict
+from django.db import transaction
+from store import estoque
+from store.cache import invalidar_produtos
+from store.models import Compra, ItemCompra, ItemCarrinho, Produto
+from store.rollups import registrar_venda
+
+
+class CarrinhoVazio(Exception):
+    pass
+
+
+class QuantidadeInvalida(Exception):
+    pass
+
+
+class EstoqueInsuficiente(Exception):
+
+    def __init__(self, produtos):
+        super().__init__('Quantidade maior que o estoque')
+        self.produtos = produtos
+
+
+def baixar_estoque(itens):
+    """
+    Baixa o estoque dos itens do carrinho com updates condicionais atômicos
+
+    Cada linha de estoque só é atualizada se ainda tiver estoque suficiente,
+    então duas compras concorrentes nunca vendem além do estoque. Os produtos
+    são atualizados sempre na mesma ordem para evitar deadlock entre as
+    transações.
+
+    Um item reservado sai do estoque e da reserva juntos, nas linhas (faixas)
+    onde a reserva está. Os outros precisam caber no disponível: em produtos
+    quentes, o de uma faixa livre ou o de várias juntas (store.estoque.consumir).
+    Retorna a lista de ids que não tinham estoque suficiente.
+    """
+
+    # Junta, por produto, as reservas e o que é vendido sem reserva
+    reservas = defaultdict(dict)
+    livres = defaultdict(int)
+    faixas = {}
+    for item in itens:
+        if item.reservado_ate is not None:
+            reservas[item.produto_id] = estoque.somar(reservas[item.produto_id], estoque.ler_divisao(item.divisao))
+        else:
+            livres[item.produto_id] += item.quantidade
+        faixas[item.produto_id] = item.produto.faixas_estoque
+
+    esgotados = []
+    for produto_id in sorted(faixas, key=str):
+        if produto_id in reservas and not estoque.vender_reserva(produto_id, reservas[produto_id]):
+            esgotados.append(produto_id)
+        elif produto_id in livres and estoque.consumir(produto_id, livres[produto_id], faixas=faixas[produto_id]) is None:
+            esgotados.append(produto_id)
+
+    invalidar_produtos(faixas, cadastro=False)
+    return esgotados
+
+
+def finalizar_compra(cliente):
+    """
+    Transforma o carrinho do cliente em uma compra em uma única transação
+
+    Os itens com reserva ativa já têm o estoque garantido. Se algum produto
+    não tiver estoque a transação inteira é desfeita e EstoqueInsuficiente
+    informa quais produtos faltaram.
+    """
+
+    with transaction.atomic():
+        # Trava só os itens do carrinho, para a expiração das reservas pular
+        # esse carrinho enquanto a compra não termina
+        itens_carrinho = list(
+            ItemCarrinho.objects.filter(cliente=cliente).select_related('produto').select_for_update(of=('self',))
+        )
+        if not itens_carrinho:
+            raise CarrinhoVazio()
+
+        # Junta linhas repetidas do mesmo produto
+        quantidades = {}
+        reservadas = {}
+        produtos = {}
+        for item in itens_carrinho:
+            if item.quantidade <= 0:
+                raise QuantidadeInvalida()
+            quantidades[item.produto_id] = quantidades.get(item.produto_id, 0) + item.quantidade
+            if item.reservado_ate:
+                reservadas[item.produto_id] = reservadas.get(item.produto_id, 0) + item.quantidade
+            produtos[item.produto_id] = item.produto
+
+        esgotados = baixar_estoque(itens_carrinho)
+        if esgotados:
+            disponiveis = {
+                produto_id: total - reservado + reservadas.get(produto_id, 0)
+                for produto_id, (total, reservado) in estoque.totais(Produto.objects.filter(pk__in=esgotados)).items()
+            }
+            raise EstoqueInsuficiente([
+                {
+                    'id': produto_id,
+                    'nome': produtos[produto_id].nome,
+                    'quantidade': quantidades[produto_id],
+                    'estoque': disponiveis.get(produto_id, 0),
+                }
+                for produto_id in esgotados
+            ])
+
+        itens = []
+        valor_total = 0
+        for produto_id, quantidade in quantidades.items():
+            produto = produtos[produto_id]
+            preco = produto.preco_final
+            valor_total += preco * quantidade
+            itens.append(ItemCompra(produto=produto, preco_unidade=preco, quantidade=quantidade, desconto_aplicado=produto.desconto_vigente))
+
+        compra = Compra.objects.create(cliente=cliente, valor_total=valor_total)
+        for item in itens:
+            item.compra = compra
+        ItemCompra.objects.bulk_create(itens)
+        registrar_venda(compra, itens)
+
+        # limpa o carrinho; as reservas já viraram baixa de estoque
+        ItemCarrinho.objects.filter(pk__in=[item.pk for item in itens_carrinho]).delete()
+
+    return compra
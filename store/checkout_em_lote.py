@@ -0,0 +1,178 @@
+import math
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from store import estoque
+from store.cache import invalidar_compras, invalidar_produtos
+from store.checkout import CarrinhoVazio, QuantidadeInvalida
+from store.models import Compra, ItemCarrinho, ItemCompra
+from store.rollups import registrar_vendas
+
+CHAVE_AGENDADO = 'store:checkout:agendado'
+
+
+def janela():
+    return getattr(settings, 'CHECKOUT_JANELA_LOTE_SEGUNDOS', 0.5)
+
+
+def aceitar_compra(cliente):
+    """
+    Registra o carrinho como uma compra pendente, sem mexer no estoque
+
+    Os itens saem do carrinho para a compra com os preços de agora, levando as
+    reservas junto. O estoque é baixado depois, em lote, por processar_pendentes.
+    """
+
+    with transaction.atomic():
+        itens_carrinho = list(
+            ItemCarrinho.objects.filter(cliente=cliente).select_related('produto').select_for_update(of=('self',))
+        )
+        if not itens_carrinho:
+            raise CarrinhoVazio()
+
+        itens = []
+        valor_total = 0
+        for item in itens_carrinho:
+            if item.quantidade <= 0:
+                raise QuantidadeInvalida()
+            produto = item.produto
+            preco = produto.preco_final
+            valor_total += preco * item.quantidade
+            itens.append(ItemCompra(
+                produto=produto, preco_unidade=preco, quantidade=item.quantidade, desconto_aplicado=produto.desconto_vigente,
+                divisao_reserva=item.divisao if item.reservado_ate else None,
+            ))
+
+        compra = Compra.objects.create(cliente=cliente, valor_total=valor_total, status=Compra.PENDENTE)
+        for item in itens:
+            item.compra = compra
+        ItemCompra.objects.bulk_create(itens)
+
+        # Sem liberar as reservas: elas são consumidas quando a compra for processada
+        ItemCarrinho.objects.filter(pk__in=[item.pk for item in itens_carrinho]).delete()
+        transaction.on_commit(agendar_processamento)
+
+    return compra
+
+
+def agendar_processamento():
+    """
+    Agenda o processamento das pendentes para daqui a CHECKOUT_JANELA_LOTE_SEGUNDOS
+
+    Só a primeira compra de cada janela agenda a tarefa; as que chegarem
+    até ela começar entram no mesmo lote.
+    """
+
+    from store.tasks import processar_compras_pendentes
+
+    # A tarefa apaga a chave ao começar; o timeout só cobre uma tarefa perdida
+    if cache.add(CHAVE_AGENDADO, 1, timeout=max(60, math.ceil(janela()))):
+        processar_compras_pendentes.apply_async(countdown=janela())
+
+
+def processar_pendentes(tamanho_lote=None):
+    """
+    Processa as compras pendentes em lotes, na ordem de chegada
+
+    Retorna quantas compras foram processadas (concluídas ou recusadas).
+    """
+
+    tamanho_lote = tamanho_lote or getattr(settings, 'CHECKOUT_TAMANHO_LOTE', 500)
+    cache.delete(CHAVE_AGENDADO)
+
+    total = 0
+    while True:
+        processadas = _processar_lote(tamanho_lote)
+        total += processadas
+        if processadas < tamanho_lote:
+            return total
+
+
+def _processar_lote(tamanho_lote):
+    """
+    Baixa o estoque de um lote de compras pendentes agrupando por produto
+
+    As quantidades de todas as compras do lote são baixadas juntas por
+    produto (as reservas nas faixas onde estão, o resto pelo disponível do
+    produto), então cada produto quente é tocado uma vez por lote e não uma
+    vez por compra. Se o total não couber, aquele produto é baixado
+    compra a compra, na ordem de chegada, e as que não couberem são recusadas;
+    o que já tinha sido baixado para elas em outros produtos volta ao estoque.
+    """
+
+    with transaction.atomic():
+        compras = list(
+            Compra.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=Compra.PENDENTE)
+            .order_by('data_compra', 'id')[:tamanho_lote]
+        )
+        if not compras:
+            return 0
+
+        ordem = {compra.pk: indice for indice, compra in enumerate(compras)}
+        itens = list(ItemCompra.objects.filter(compra__in=compras).select_related('produto'))
+
+        grupos = defaultdict(list)
+        for item in itens:
+            grupos[(item.produto_id, item.divisao_reserva is not None)].append(item)
+
+        def baixar(produto_id, quantidade, reserva, faixas):
+            # Retorna a divisão de onde o estoque saiu ou None se não coube
+            if reserva is None:
+                return estoque.consumir(produto_id, quantidade, faixas=faixas)
+            return reserva if estoque.vender_reserva(produto_id, reserva) else None
+
+        baixados = {}  # item -> divisão de onde o estoque saiu
+        recusadas = {}  # compra -> motivo
+        for chave in sorted(grupos, key=str):
+            produto_id, reservado = chave
+            linha = grupos[chave]
+            faixas = linha[0].produto.faixas_estoque
+            reservas = {item.pk: estoque.ler_divisao(item.divisao_reserva) for item in linha} if reservado else {}
+
+            quantidade = sum(item.quantidade for item in linha)
+            usada = baixar(produto_id, quantidade, estoque.somar(*reservas.values()) if reservado else None, faixas)
+            if usada is not None:
+                for item in linha:
+                    if reservado:
+                        baixados[item.pk] = reservas[item.pk]
+                    else:
+                        # O que saiu para o grupo é repartido entre as compras
+                        baixados[item.pk], usada = estoque.separar(usada, item.quantidade)
+                continue
+
+            for item in sorted(linha, key=lambda item: ordem[item.compra_id]):
+                if item.compra_id in recusadas:
+                    continue
+                usada = baixar(produto_id, item.quantidade, reservas.get(item.pk), faixas)
+                if usada is None:
+                    recusadas[item.compra_id] = f'Estoque insuficiente: {item.produto.nome}'
+                else:
+                    baixados[item.pk] = usada
+
+        # Desfaz as compras recusadas: o que foi baixado volta ao estoque e as
+        # reservas que não foram consumidas são liberadas
+        for item in itens:
+            if item.compra_id not in recusadas:
+                continue
+            if item.pk in baixados:
+                estoque.devolver(item.produto_id, baixados[item.pk])
+            elif item.divisao_reserva is not None:
+                estoque.liberar(item.produto_id, estoque.ler_divisao(item.divisao_reserva))
+
+        itens_por_compra = defaultdict(list)
+        for item in itens:
+            itens_por_compra[item.compra_id].append(item)
+
+        concluidas = [compra for compra in compras if compra.pk not in recusadas]
+        registrar_vendas([(compra, itens_por_compra[compra.pk]) for compra in concluidas])
+        Compra.objects.filter(pk__in=[compra.pk for compra in concluidas]).update(status=Compra.CONCLUIDA)
+        for compra_id, motivo in recusadas.items():
+            Compra.objects.filter(pk=compra_id).update(status=Compra.RECUSADA, motivo=motivo)
+
+        invalidar_compras([compra.pk for compra in compras])
+        invalidar_produtos({item.produto_id for item in itens}, cadastro=False)
+
+    return len(compras)
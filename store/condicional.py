@@ -0,0 +1,30 @@
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+class Condicional:
+    """
+    ETag forte e Last-Modified a partir das versões guardadas no cache
+
+    As versões são timestamps em microssegundos (store.cache.versao), então a
+    maior delas é a data da última alteração. Como não depende do corpo da
+    resposta, um If-None-Match que bate é respondido com 304 antes de consultar
+    o banco.
+    """
+
+    def __init__(self, tipo, versoes, complemento=None):
+        partes = [tipo, *versoes] + ([complemento] if complemento else [])
+        self.etag = '"' + '-'.join(str(parte) for parte in partes) + '"'
+        self.ultima_modificacao = max(versoes) // 1_000_000
+
+    def nao_modificado(self, request):
+        """
+        Resposta 304 (ou 412) se o cliente já tem a versão atual, senão None
+        """
+
+        return get_conditional_response(request, etag=self.etag, last_modified=self.ultima_modificacao)
+
+    def aplicar(self, response):
+        response['ETag'] = self.etag
+        response['Last-Modified'] = http_date(self.ultima_modificacao)
+        return response
@@ -0,0 +1,32 @@
+import time
+from django.conf import settings
+from django.db import connections
+
+
+def verificar_conexoes(**kwargs):
+    """
+    Fecha conexões persistentes que o banco derrubou antes de serem usadas
+
+    Com CONN_MAX_AGE a conexão fica aberta entre requisições e pode ter sido
+    encerrada pelo PostgreSQL (reinício, timeout, failover). Só conexões
+    paradas há mais de CONN_VERIFICACAO_INTERVALO segundos são testadas, para
+    não pagar um SELECT 1 em toda requisição.
+    """
+
+    intervalo = getattr(settings, 'CONN_VERIFICACAO_INTERVALO', None)
+    if intervalo is None:
+        return
+    agora = time.monotonic()
+    for conexao in connections.all():
+        if conexao.connection is None:
+            continue
+        ultimo_uso = getattr(conexao, 'ultimo_uso', agora)
+        if agora - ultimo_uso >= intervalo and not conexao.is_usable():
+            conexao.close()
+
+
+def marcar_uso(**kwargs):
+    agora = time.monotonic()
+    for conexao in connections.all():
+        if conexao.connection is not None:
+            conexao.ultimo_uso = agora
@@ -0,0 +1,178 @@
+import random
+import uuid
+from array import array
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from store import rollups
+from store.cache import invalidar_compras, invalidar_todos_produtos
+from store.models import Cliente, Compra, ItemCompra, Produto
+from store.precos import calcular_preco_final
+
+NOMES = ['Camiseta', 'Calça', 'Sapato', 'Boné', 'Meia', 'Jaqueta', 'Bermuda', 'Tênis', 'Moletom', 'Vestido']
+CORES = ['branca', 'preta', 'azul', 'verde', 'vermelha', 'cinza', 'amarela', 'rosa']
+DESCONTOS = [0, 0, 0, 0, 5, 10, 15, 20]
+PRIMEIROS_NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Felipe', 'Gabriela', 'Henrique', 'Isabela', 'João']
+SOBRENOMES = ['Silva', 'Souza', 'Oliveira', 'Santos', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima', 'Gomes']
+
+
+class DadosJaGerados(Exception):
+    pass
+
+
+def prefixo_sku(semente):
+    return f'SIN-{semente}-'
+
+
+def produto_sintetico(semente, indice):
+    """
+    Gera o produto de índice i de forma determinística a partir da semente
+
+    Como o produto é recalculado a partir do índice, a geração das compras não
+    precisa guardar os produtos em memória.
+    """
+
+    rng = random.Random(f'{semente}-produto-{indice}')
+    nome = rng.choice(NOMES)
+    cor = rng.choice(CORES)
+    produto = Produto(
+        id=uuid.UUID(int=rng.getrandbits(128), version=4),
+        sku=f'{prefixo_sku(semente)}{indice:08d}',
+        nome=f'{nome} {cor} {indice}',
+        descricao=f'{nome} na cor {cor}',
+        preco=Decimal(rng.randint(500, 50000)) / 100,
+        estoque=rng.randint(50, 5000),
+        desconto=rng.choice(DESCONTOS),
+    )
+    # bulk_create não passa pelo save, que é quem calcula o preço final
+    produto.preco_final = calcular_preco_final(produto.preco, produto.desconto)
+    return produto
+
+
+def _gravar_em_lotes(model, objetos, tamanho_lote):
+    lote = []
+    total = 0
+    for objeto in objetos:
+        lote.append(objeto)
+        if len(lote) >= tamanho_lote:
+            model.objects.bulk_create(lote)
+            total += len(lote)
+            lote = []
+    model.objects.bulk_create(lote)
+    return total + len(lote)
+
+
+def gerar(produtos, clientes, compras, itens_por_compra, semente=42, tamanho_lote=5000, dias=365, log=None):
+    """
+    Gera um conjunto de dados consistente e reproduzível
+
+    Produtos, clientes, compras e itens são gravados com bulk_create em lotes,
+    então a memória usada não depende do tamanho do conjunto (só um array com
+    o estoque restante de cada produto). Os estoques finais são o estoque
+    inicial menos o que foi vendido, os totais das compras batem com os itens e
+    os preços dos itens já levam o desconto do produto. A mesma semente em um
+    banco vazio gera sempre os mesmos dados.
+    """
+
+    log = log or (lambda mensagem: None)
+    prefixo = prefixo_sku(semente)
+    if Produto.objects.filter(sku__startswith=prefixo).exists():
+        raise DadosJaGerados(f'Já existem dados gerados com a semente {semente}')
+
+    rng = random.Random(semente)
+    # As datas das compras são contadas a partir da meia-noite do dia da geração
+    referencia = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # Produtos
+    restante = array('i')
+
+    def gerar_produtos():
+        for indice in range(produtos):
+            produto = produto_sintetico(semente, indice)
+            restante.append(produto.estoque)
+            yield produto
+    _gravar_em_lotes(Produto, gerar_produtos(), tamanho_lote)
+    log(f'{produtos} produtos')
+
+    # Clientes com ids explícitos, para as compras não precisarem consultar o banco
+    primeiro_cliente = (Cliente.objects.aggregate(maximo=Max('id'))['maximo'] or 0) + 1
+
+    def gerar_clientes():
+        for indice in range(clientes):
+            cliente_id = primeiro_cliente + indice
+            yield Cliente(
+                id=cliente_id,
+                nome=rng.choice(PRIMEIROS_NOMES),
+                sobrenome=rng.choice(SOBRENOMES),
+                cpf_cnpj=f'{cliente_id:011d}',
+                email=f'cliente{cliente_id}@{prefixo.lower().strip("-")}.com',
+                telefone=f'{rng.randint(10 ** 10, 10 ** 11 - 1)}',
+                endereco=f'Rua {rng.randint(1, 999)}, {rng.randint(1, 9999)}',
+            )
+    _gravar_em_lotes(Cliente, gerar_clientes(), tamanho_lote)
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Cliente]):
+            cursor.execute(sql)
+    log(f'{clientes} clientes')
+
+    # Compras e itens
+    total_compras = 0
+    total_itens = 0
+    lote_compras = []
+    lote_itens = []
+    for _ in range(compras if produtos and clientes else 0):
+        compra = Compra(
+            id=uuid.UUID(int=rng.getrandbits(128), version=4),
+            cliente_id=primeiro_cliente + rng.randrange(clientes),
+            data_compra=referencia - timedelta(seconds=rng.randrange(dias * 24 * 3600)),
+        )
+
+        itens = {}
+        for _ in range(itens_por_compra):
+            indice = rng.randrange(produtos)
+            quantidade = min(rng.randint(1, 5), restante[indice])
+            if quantidade <= 0 or indice in itens:
+                continue
+            restante[indice] -= quantidade
+            itens[indice] = quantidade
+        if not itens:
+            continue
+
+        valor_total = 0
+        for indice, quantidade in itens.items():
+            produto = produto_sintetico(semente, indice)
+            preco = produto.preco_final
+            valor_total += preco * quantidade
+            lote_itens.append(ItemCompra(compra_id=compra.id, produto_id=produto.id, preco_unidade=preco, quantidade=quantidade, desconto_aplicado=produto.desconto_vigente))
+        compra.valor_total = valor_total
+        lote_compras.append(compra)
+
+        if len(lote_itens) >= tamanho_lote:
+            total_compras += len(lote_compras)
+            total_itens += _gravar_compras(lote_compras, lote_itens)
+            lote_compras, lote_itens = [], []
+    total_compras += len(lote_compras)
+    total_itens += _gravar_compras(lote_compras, lote_itens)
+    log(f'{total_compras} compras com {total_itens} itens')
+
+    # Estoque final = estoque inicial - vendido, em um único UPDATE
+    vendidos = ItemCompra.objects.filter(produto=OuterRef('pk')).values('produto').annotate(total=Sum('quantidade')).values('total')
+    Produto.objects.filter(sku__startswith=prefixo).update(estoque=F('estoque') - Coalesce(Subquery(vendidos), Value(0)))
+    invalidar_todos_produtos()
+    invalidar_compras([])
+
+    rollups.reconstruir()
+    log('rollups reconstruídos')
+
+    return {'produtos': produtos, 'clientes': clientes, 'compras': total_compras, 'itens': total_itens}
+
+
+def _gravar_compras(compras, itens):
+    with transaction.atomic():
+        Compra.objects.bulk_create(compras)
+        ItemCompra.objects.bulk_create(itens)
+    return len(itens)
@@ -0,0 +1,277 @@
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q, Sum, Value
+from django.db.models.functions import Greatest
+from store.cache import invalidar_produtos
+from store.models import DISPONIVEL, FaixaEstoque, Produto
+
+
+def _linha(produto_id, faixa):
+    if faixa:
+        return FaixaEstoque.objects.filter(produto_id=produto_id, numero=faixa)
+    return Produto.objects.filter(pk=produto_id)
+
+
+def ler_divisao(dados):
+    """
+    Divisão gravada em JSON (chaves em texto) de volta para {faixa: quantidade}
+    """
+
+    return {int(faixa): quantidade for faixa, quantidade in (dados or {}).items()}
+
+
+def somar(*divisoes):
+    resultado = {}
+    for divisao in divisoes:
+        for faixa, quantidade in divisao.items():
+            resultado[faixa] = resultado.get(faixa, 0) + quantidade
+    return resultado
+
+
+def separar(divisao, quantidade):
+    """
+    Tira quantidade de uma divisão, a começar pela linha do produto
+
+    Retorna (tirada, restante).
+    """
+
+    tirada, restante = {}, dict(divisao)
+    for faixa in sorted(divisao):
+        if not quantidade:
+            break
+        parte = min(restante[faixa], quantidade)
+        tirada[faixa] = parte
+        quantidade -= parte
+        if parte == restante[faixa]:
+            del restante[faixa]
+        else:
+            restante[faixa] -= parte
+    return tirada, restante
+
+
+def _aplicar(produto_id, divisao, estoque=0, reservado=0):
+    """
+    Soma estoque * parte ao estoque e reservado * parte à reserva de cada linha da divisão
+
+    Se o disponível diminui, cada linha só é atualizada se a sua parte couber;
+    quando alguma não cabe, as já atualizadas são desfeitas e retorna False.
+    As linhas são tocadas sempre na mesma ordem (produto e depois as faixas).
+    """
+
+    def atualizar(linha, parte, sinal=1):
+        variacoes = {'estoque': estoque, 'reservado': reservado}
+        return linha.update(**{campo: F(campo) + sinal * variacao * parte for campo, variacao in variacoes.items() if variacao})
+
+    feitas = []
+    for faixa in sorted(divisao):
+        parte = divisao[faixa]
+        linha = _linha(produto_id, faixa)
+        if reservado >= estoque:
+            linha = linha.filter(estoque__gte=F('reservado') + (reservado - estoque) * parte)
+        if not atualizar(linha, parte):
+            for feita in feitas:
+                atualizar(_linha(produto_id, feita), divisao[feita], -1)
+            return False
+        feitas.append(faixa)
+    return True
+
+
+def consumir(produto_id, quantidade, reservar=False, faixas=0):
+    """
+    Vende (ou, com reservar=True, reserva) quantidade do disponível de um produto, se couber
+
+    Em um produto quente (faixas > 0) tenta primeiro a primeira faixa com
+    disponível para a quantidade inteira que nenhuma outra transação esteja
+    travando (SKIP LOCKED), então compras concorrentes caem em linhas
+    diferentes; depois a linha do produto. Se nenhuma linha sozinha couber,
+    trava o produto e as faixas (nessa ordem, como rebalancear) e divide a
+    quantidade entre elas, com a linha do produto por último. Precisa rodar
+    dentro de uma transação. Retorna a divisão usada ({faixa: quantidade})
+    ou None se não coube.
+    """
+
+    variacao = {'reservado': 1} if reservar else {'estoque': -1}
+    cabe = Q(estoque__gte=F('reservado') + quantidade)
+
+    if faixas:
+        livre = (
+            FaixaEstoque.objects
+            .select_for_update(skip_locked=True)
+            .filter(cabe, produto_id=produto_id, numero__lte=faixas)
+            .order_by('numero')
+            .values_list('numero', flat=True)
+            .first()
+        )
+        if livre is not None and _aplicar(produto_id, {livre: quantidade}, **variacao):
+            return {livre: quantidade}
+
+    if _aplicar(produto_id, {0: quantidade}, **variacao):
+        return {0: quantidade}
+    if not faixas:
+        return None
+
+    # Nenhuma linha sozinha tem a quantidade: junta o disponível de todas
+    produto = Produto.objects.select_for_update().filter(pk=produto_id).values_list('estoque', 'reservado').first()
+    if produto is None:
+        return None
+    linhas = list(
+        FaixaEstoque.objects
+        .select_for_update()
+        .filter(produto_id=produto_id, numero__lte=faixas)
+        .order_by('numero')
+        .values_list('numero', 'estoque', 'reservado')
+    )
+    divisao = {}
+    falta = quantidade
+    for numero, estoque, reservado in [*linhas, (0, *produto)]:
+        parte = min(max(estoque - reservado, 0), falta)
+        if parte:
+            divisao[numero] = parte
+            falta -= parte
+    if falta or not _aplicar(produto_id, divisao, **variacao):
+        return None
+    return divisao
+
+
+def vender_reserva(produto_id, divisao):
+    """
+    Tira do estoque e da reserva, juntos, as partes de uma reserva; retorna False se não coube
+    """
+
+    return _aplicar(produto_id, divisao, estoque=-1, reservado=-1)
+
+
+def liberar(produto_id, divisao):
+    """
+    Devolve uma reserva ao disponível das linhas onde ela estava
+    """
+
+    _aplicar(produto_id, divisao, reservado=-1)
+
+
+def devolver(produto_id, divisao):
+    """
+    Desfaz uma baixa: cada parte volta ao estoque da linha de onde saiu
+    """
+
+    _aplicar(produto_id, divisao, estoque=1)
+
+
+def disponivel(produto_id, faixas=0):
+    """
+    Estoque menos as reservas ativas de um produto, somando as faixas em uso
+    """
+
+    livre = Greatest(F('estoque') - F('reservado'), Value(0))
+    total = Produto.objects.filter(pk=produto_id).values_list(livre, flat=True).first() or 0
+    if faixas:
+        total += FaixaEstoque.objects.filter(produto_id=produto_id, numero__lte=faixas).aggregate(livre=Sum(livre))['livre'] or 0
+    return total
+
+
+def com_disponivel(produtos):
+    """
+    Só os produtos (queryset) com disponível na própria linha ou em alguma faixa
+
+    O primeiro filtro é a condição dos índices parciais; nos produtos quentes
+    as faixas são conferidas com um EXISTS.
+    """
+
+    faixas = FaixaEstoque.objects.filter(produto=OuterRef('pk'), estoque__gt=F('reservado'))
+    return produtos.filter(DISPONIVEL).filter(Q(estoque__gt=F('reservado')) | Q(Exists(faixas)))
+
+
+def nas_faixas(produto_ids):
+    """
+    Estoque e reservas somados nas faixas de cada produto: {id: (estoque, reservado)}
+
+    Não faz query se a lista estiver vazia.
+    """
+
+    if not produto_ids:
+        return {}
+    somas = FaixaEstoque.objects.filter(produto_id__in=produto_ids).values('produto_id').annotate(estoque=Sum('estoque'), reservado=Sum('reservado'))
+    return {soma['produto_id']: (soma['estoque'], soma['reservado']) for soma in somas}
+
+
+def totais(produtos):
+    """
+    Estoque e reservas somando as faixas dos produtos quentes: {id: (estoque, reservado)}
+
+    Só faz uma query se houver algum produto com faixas.
+    """
+
+    resultado = {produto.id: (produto.estoque, produto.reservado) for produto in produtos}
+    for produto_id, (estoque, reservado) in nas_faixas([produto.id for produto in produtos if produto.faixas_estoque]).items():
+        resultado[produto_id] = (resultado[produto_id][0] + estoque, resultado[produto_id][1] + reservado)
+    return resultado
+
+
+def rebalancear(produto_id):
+    """
+    Divide o estoque livre de um produto igualmente entre as faixas
+
+    As reservas ficam onde estão; o que sobra da divisão fica na linha do
+    produto. Faixas acima de faixas_estoque (o produto deixou de ser quente ou
+    ficou com menos faixas) devolvem o livre e são apagadas quando não têm
+    mais reservas. O estoque total não muda.
+    """
+
+    with transaction.atomic():
+        produto = Produto.objects.select_for_update().get(pk=produto_id)
+        faixas = {faixa.numero: faixa for faixa in FaixaEstoque.objects.select_for_update().filter(produto=produto)}
+
+        livre = produto.estoque - produto.reservado + sum(faixa.estoque - faixa.reservado for faixa in faixas.values())
+        quantidade = produto.faixas_estoque
+        por_faixa, resto = divmod(max(livre, 0), quantidade) if quantidade else (0, max(livre, 0))
+
+        novas = []
+        for numero in range(1, quantidade + 1):
+            faixa = faixas.get(numero)
+            if faixa is None:
+                novas.append(FaixaEstoque(produto=produto, numero=numero, estoque=por_faixa))
+            else:
+                faixa.estoque = faixa.reservado + por_faixa
+
+        sobrando = [faixa for numero, faixa in faixas.items() if numero > quantidade]
+        for faixa in sobrando:
+            faixa.estoque = faixa.reservado
+
+        FaixaEstoque.objects.bulk_update(list(faixas.values()), ['estoque'])
+        FaixaEstoque.objects.bulk_create(novas)
+        FaixaEstoque.objects.filter(pk__in=[faixa.pk for faixa in sobrando], reservado=0).delete()
+
+        # Um livre negativo (estoque reduzido abaixo das reservas) fica na linha do produto
+        Produto.objects.filter(pk=produto.pk).update(estoque=produto.reservado + resto + min(livre, 0))
+        invalidar_produtos([produto.pk], cadastro=False)
+
+
+def rebalancear_todos():
+    """
+    Rebalanceia os produtos quentes e os que ainda têm faixas de quando eram
+
+    Retorna quantos produtos foram rebalanceados.
+    """
+
+    ids = (
+        Produto.objects
+        .filter(Q(faixas_estoque__gt=0) | Q(faixaestoque__isnull=False))
+        .values_list('id', flat=True)
+        .distinct()
+    )
+    total = 0
+    for produto_id in list(ids):
+        rebalancear(produto_id)
+        total += 1
+    return total
+
+
+def definir_estoque(produto_id, estoque):
+    """
+    Define o estoque total de um produto quente e redistribui entre as faixas
+    """
+
+    with transaction.atomic():
+        produto = Produto.objects.select_for_update().get(pk=produto_id)
+        nas_faixas = FaixaEstoque.objects.select_for_update().filter(produto=produto).aggregate(total=Sum('estoque'))['total'] or 0
+        Produto.objects.filter(pk=produto.pk).update(estoque=estoque - nas_faixas)
+        rebalancear(produto.pk)
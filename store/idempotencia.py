@@ -0,0 +1,110 @@
+import hashlib
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+CABECALHO = 'Idempotency-Key'
+TAMANHO_MAXIMO_CHAVE = 255
+INTERVALO_ESPERA = 0.05
+
+
+def ttl():
+    return getattr(settings, 'IDEMPOTENCIA_TTL_SEGUNDOS', 24 * 3600)
+
+
+def espera():
+    return getattr(settings, 'IDEMPOTENCIA_ESPERA_SEGUNDOS', 10)
+
+
+def ttl_trava():
+    return getattr(settings, 'IDEMPOTENCIA_TRAVA_SEGUNDOS', 60)
+
+
+def _chaves(request, chave):
+    # A mesma chave em rotas diferentes são requisições diferentes
+    resumo = hashlib.sha256(f'{request.method} {request.path} {chave}'.encode()).hexdigest()
+    return f'store:idempotencia:{resumo}', f'store:idempotencia:trava:{resumo}'
+
+
+def _repetir(salva):
+    response = Response(salva['data'], status=salva['status'])
+    for cabecalho, valor in salva['cabecalhos'].items():
+        response[cabecalho] = valor
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotente(acao):
+    """
+    Torna uma ação de escrita idempotente pelo header Idempotency-Key
+
+    A primeira resposta (menos erros 5xx, que podem ser tentados de novo) fica
+    no cache por IDEMPOTENCIA_TTL_SEGUNDOS; as repetições com a mesma chave
+    recebem essa resposta sem rodar a ação. Requisições simultâneas com a
+    mesma chave são coalescidas: só a que pega a trava (cache.add) executa e
+    as outras esperam até IDEMPOTENCIA_ESPERA_SEGUNDOS pela resposta dela.
+    A mesma chave com outro corpo responde 422. Sem o header nada muda.
+    """
+
+    @wraps(acao)
+    def executar(self, request, *args, **kwargs):
+        chave = request.headers.get(CABECALHO)
+        if chave is None:
+            return acao(self, request, *args, **kwargs)
+        if not chave or len(chave) > TAMANHO_MAXIMO_CHAVE:
+            return Response(
+                {'error': 'Dados inválidos', 'message': f'{CABECALHO} deve ter de 1 a {TAMANHO_MAXIMO_CHAVE} caracteres'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        chave_resposta, chave_trava = _chaves(request, chave)
+        # Lido antes da ação; o DRF continua conseguindo ler o corpo depois
+        impressao = hashlib.sha256(request.body).hexdigest()
+
+        def salva_ou_conflito():
+            salva = cache.get(chave_resposta)
+            if salva is None:
+                return None
+            if salva['impressao'] != impressao:
+                return Response(
+                    {'error': 'Dados inválidos', 'message': f'{CABECALHO} já usada com outra requisição'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            return _repetir(salva)
+
+        prazo = time.monotonic() + espera()
+        while True:
+            response = salva_ou_conflito()
+            if response is not None:
+                return response
+            if cache.add(chave_trava, 1, timeout=ttl_trava()):
+                break
+            if time.monotonic() >= prazo:
+                return Response(
+                    {'error': 'Requisição em andamento', 'message': f'Outra requisição com a mesma {CABECALHO} ainda está sendo processada'},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            time.sleep(INTERVALO_ESPERA)
+
+        try:
+            # A anterior pode ter terminado entre a leitura e a trava
+            response = salva_ou_conflito()
+            if response is not None:
+                return response
+
+            response = acao(self, request, *args, **kwargs)
+            if response.status_code < 500:
+                cache.set(chave_resposta, {
+                    'impressao': impressao,
+                    'status': response.status_code,
+                    'data': response.data,
+                    'cabecalhos': {cabecalho: response[cabecalho] for cabecalho in ('Location',) if response.has_header(cabecalho)},
+                }, timeout=ttl())
+            return response
+        finally:
+            cache.delete(chave_trava)
+
+    return executar
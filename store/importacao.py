@@ -0,0 +1,222 @@
+import csv
+import io
+import json
+from decimal import Decimal
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from store import estoque
+from store.cache import invalidar_produtos
+from store.models import Produto
+from store.precos import calcular_preco_final, recalcular_precos
+from store.validacao import validar_produto
+
+CAMPOS = ('id', 'sku', 'nome', 'descricao', 'preco', 'estoque', 'desconto')
+MAXIMO_ERROS = 1000
+
+
+def ler_csv(arquivo):
+    """
+    Lê um CSV com cabeçalho linha a linha, gerando (número da linha, dicionário)
+    """
+
+    for numero, linha in enumerate(csv.DictReader(arquivo), start=2):
+        yield numero, linha
+
+
+def ler_jsonl(arquivo):
+    """
+    Lê um JSONL (um objeto JSON por linha), gerando (número da linha, dicionário)
+    """
+
+    for numero, linha in enumerate(arquivo, start=1):
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            dados = json.loads(linha)
+        except ValueError:
+            dados = None
+        yield numero, dados
+
+
+LEITORES = {'csv': ler_csv, 'jsonl': ler_jsonl}
+
+
+def converter(dados):
+    """
+    Converte uma linha lida do arquivo nos tipos do model e valida como no create
+
+    Levanta ValueError com a mensagem de erro se a linha for inválida.
+    """
+
+    if not isinstance(dados, dict):
+        raise ValueError('Linha inválida')
+
+    try:
+        preco = Decimal(str(dados.get('preco') or 0))
+        estoque = int(dados.get('estoque') or 0)
+        desconto = int(dados.get('desconto') or 0)
+    except (ArithmeticError, ValueError, TypeError):
+        raise ValueError('Preço, estoque ou desconto inválido')
+
+    nome = (dados.get('nome') or '').strip()
+    descricao = (dados.get('descricao') or '').strip()
+    sku = (str(dados.get('sku') or '')).strip() or None
+
+    erro = validar_produto(nome, descricao, preco, estoque)
+    if erro:
+        raise ValueError(erro)
+    if desconto < 0 or desconto > 100:
+        raise ValueError('Desconto inválido')
+    if sku and len(sku) > 50:
+        raise ValueError('O máximo de caracteres para o sku é 50')
+
+    return {'sku': sku, 'nome': nome, 'descricao': descricao, 'preco': preco, 'estoque': estoque, 'desconto': desconto}
+
+
+def _quentes(lote):
+    """
+    Produtos do lote que já existem e têm estoque em faixas: {sku: id}
+    """
+
+    skus = [linha['sku'] for linha in lote if linha['sku']]
+    produtos = Produto.objects.filter(sku__in=skus).filter(Q(faixas_estoque__gt=0) | Q(faixaestoque__isnull=False))
+    return dict(produtos.distinct().values_list('sku', 'id'))
+
+
+def _gravar_copy(lote, quentes):
+    """
+    Grava o lote no PostgreSQL com COPY para uma tabela temporária e um
+    INSERT ... ON CONFLICT (sku) a partir dela. Retorna (ids, criados).
+
+    A tabela temporária só tem os defaults do banco, então o COPY leva todas
+    as colunas de Produto: as do arquivo, preco_final calculado e as outras
+    (reservado, faixas_estoque...) com o default do model. Um SKU que já
+    existe só tem os campos do arquivo atualizados, menos o estoque dos
+    produtos quentes (quentes), que fica para estoque.definir_estoque.
+    """
+
+    tabela = Produto._meta.db_table
+    fields = Produto._meta.concrete_fields
+    colunas = ', '.join(field.column for field in fields)
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for linha in lote:
+        valores = {field.attname: field.get_default() for field in fields}
+        valores.update(linha, preco_final=calcular_preco_final(linha['preco'], linha['desconto']))
+        escritor.writerow([valores[field.attname] for field in fields])
+    buffer.seek(0)
+
+    atualizacoes = ', '.join(
+        f'estoque = CASE WHEN {tabela}.id = ANY(%s) THEN {tabela}.estoque ELSE EXCLUDED.estoque END'
+        if campo == 'estoque' else f'{campo} = EXCLUDED.{campo}'
+        for campo in CAMPOS[2:]
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE TEMP TABLE importacao_produto (LIKE {tabela} INCLUDING DEFAULTS) ON COMMIT DROP')
+        cursor.copy_expert(f'COPY importacao_produto ({colunas}) FROM STDIN WITH (FORMAT csv)', buffer)
+        cursor.execute(
+            f'INSERT INTO {tabela} ({colunas}) SELECT {colunas} FROM importacao_produto '
+            f'ON CONFLICT (sku) DO UPDATE SET {atualizacoes} '
+            f'RETURNING id, (xmax = 0)',
+            [list(quentes.values())],
+        )
+        resultado = cursor.fetchall()
+        cursor.execute('DROP TABLE importacao_produto')
+
+    return [linha[0] for linha in resultado], sum(1 for linha in resultado if linha[1])
+
+
+def _gravar_bulk(lote, quentes):
+    """
+    Grava o lote com bulk_create para os produtos novos e bulk_update para os
+    SKUs que já existem. Retorna (ids, criados).
+
+    O estoque dos produtos quentes (quentes) não é gravado aqui, fica para
+    estoque.definir_estoque.
+    """
+
+    skus = [linha['sku'] for linha in lote if linha['sku']]
+    existentes = {produto.sku: produto for produto in Produto.objects.filter(sku__in=skus)}
+
+    novos = []
+    atualizados = []
+    atualizados_quentes = []
+    for linha in lote:
+        produto = existentes.get(linha['sku']) if linha['sku'] else None
+        if produto:
+            for campo, valor in linha.items():
+                setattr(produto, campo, valor)
+            (atualizados_quentes if produto.sku in quentes else atualizados).append(produto)
+        else:
+            novos.append(Produto(**linha))
+
+    Produto.objects.bulk_create(novos)
+    Produto.objects.bulk_update(atualizados, list(CAMPOS[2:]))
+    Produto.objects.bulk_update(atualizados_quentes, [campo for campo in CAMPOS[2:] if campo != 'estoque'])
+    return [produto.id for produto in novos + atualizados + atualizados_quentes], len(novos)
+
+
+def _gravar(lote):
+    with transaction.atomic():
+        quentes = _quentes(lote)
+        if connection.vendor == 'postgresql':
+            ids, criados = _gravar_copy(lote, quentes)
+        else:
+            ids, criados = _gravar_bulk(lote, quentes)
+        # Nos produtos quentes o estoque do arquivo é o total, redistribuído entre as faixas como no update
+        for linha in lote:
+            if linha['sku'] in quentes:
+                estoque.definir_estoque(quentes[linha['sku']], linha['estoque'])
+        recalcular_precos(Produto.objects.filter(pk__in=ids))
+        invalidar_produtos(ids)
+    return criados, len(ids) - criados
+
+
+def importar_produtos(arquivo, formato, tamanho_lote=None):
+    """
+    Importa produtos de um arquivo texto (CSV ou JSONL) em lotes
+
+    O arquivo é lido aos poucos e cada lote é gravado em uma transação.
+    Produtos com um SKU que já existe são atualizados, os outros são criados.
+    Linhas inválidas não interrompem a importação e aparecem no relatório.
+    """
+
+    if formato not in LEITORES:
+        raise ValueError("formato deve ser 'csv' ou 'jsonl'")
+
+    tamanho_lote = tamanho_lote or getattr(settings, 'IMPORTACAO_TAMANHO_LOTE', 5000)
+    relatorio = {'criados': 0, 'atualizados': 0, 'rejeitados': 0, 'erros': []}
+    lote = {}
+    sem_sku = []
+
+    def gravar():
+        criados, atualizados = _gravar(list(lote.values()) + sem_sku)
+        relatorio['criados'] += criados
+        relatorio['atualizados'] += atualizados
+        lote.clear()
+        sem_sku.clear()
+
+    for numero, dados in LEITORES[formato](arquivo):
+        try:
+            linha = converter(dados)
+        except ValueError as e:
+            relatorio['rejeitados'] += 1
+            if len(relatorio['erros']) < MAXIMO_ERROS:
+                relatorio['erros'].append({'linha': numero, 'erro': str(e)})
+            continue
+
+        # O mesmo SKU repetido no arquivo fica com a última linha
+        if linha['sku']:
+            lote[linha['sku']] = linha
+        else:
+            sem_sku.append(linha)
+
+        if len(lote) + len(sem_sku) >= tamanho_lote:
+            gravar()
+
+    if lote or sem_sku:
+        gravar()
+
+    return relatorio
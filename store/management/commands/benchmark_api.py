@@ -0,0 +1,208 @@
+import io
+import random
+from datetime import datetime, timedelta
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+from projeto_trainee.celery import app as celery_app
+from store import benchmark
+from store.models import CampanhaDesconto, Cliente, Compra, ItemCarrinho, Produto
+from store.urls import router, urlpatterns
+
+
+class Command(BaseCommand):
+    help = 'Mede latência (p50/p95/p99), throughput e queries de todas as rotas da API em um banco de teste'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=2000)
+        parser.add_argument('--clientes', type=int, default=500)
+        parser.add_argument('--compras', type=int, default=5000)
+        parser.add_argument('--itens-por-compra', type=int, default=3)
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--repeticoes', type=int, default=50, help='Requisições medidas por cenário')
+        parser.add_argument('--cenarios', help='Lista de cenários separados por vírgula (padrão: todos)')
+        parser.add_argument('--saida', help='Arquivo JSON onde o resultado será gravado')
+        parser.add_argument('--comparar', help='Resultado JSON anterior para comparar')
+        parser.add_argument('--manter-banco', action='store_true', help='Não apaga o banco de teste no final (reaproveita na próxima execução)')
+
+    def handle(self, *args, **options):
+        # As tarefas só são enfileiradas em memória, como a API faz com o Redis
+        # (o Celery lê as configurações do Django com o prefixo CELERY_)
+        celery_app.conf.update(
+            CELERY_BROKER_URL='memory://',
+            CELERY_RESULT_BACKEND='cache+memory://',
+            CELERY_TASK_ALWAYS_EAGER=False,
+        )
+
+        tamanhos = {campo: options[campo] for campo in ('produtos', 'clientes', 'compras', 'itens_por_compra', 'semente')}
+        with benchmark.banco_de_teste(tamanhos, options['manter_banco'], self.stdout.write):
+            resultado = self.executar(options)
+
+        if options['saida']:
+            benchmark.salvar(resultado, options['saida'])
+            self.stdout.write(f"Resultado gravado em {options['saida']}")
+
+        if options['comparar']:
+            self.stdout.write('\nDiferença em relação ao resultado anterior (%):')
+            for linha in benchmark.comparar(resultado, benchmark.carregar(options['comparar'])):
+                self.stdout.write(f"{linha.pop('cenario'):35} " + '  '.join(f'{campo}: {valor:+.1f}' for campo, valor in linha.items()))
+
+    def executar(self, options):
+        cache.clear()
+        rng = random.Random(options['semente'])
+        client = APIClient()
+        cenarios = self.cenarios(client, rng)
+
+        selecionados = options['cenarios'].split(',') if options['cenarios'] else list(cenarios)
+        cobertas = {(view, acao) for nome in cenarios for view, acao in [cenarios[nome][0]]}
+        for rota in sorted(self.rotas() - cobertas):
+            self.stdout.write(self.style.WARNING(f'Rota sem cenário de benchmark: {rota[0]}.{rota[1]}'))
+
+        resultado = {
+            'data': datetime.now().isoformat(),
+            'banco': connection.vendor,
+            'tamanho': {campo: options[campo] for campo in ('produtos', 'clientes', 'compras', 'itens_por_compra', 'semente')},
+            'repeticoes': options['repeticoes'],
+            'cenarios': {},
+        }
+
+        self.stdout.write(f"\n{'cenario':35} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'queries':>8}")
+        for nome in selecionados:
+            _, funcao, preparar = cenarios[nome]
+            resumo = benchmark.medir(funcao, options['repeticoes'], preparar)
+            resultado['cenarios'][nome] = resumo
+            self.stdout.write(
+                f"{nome:35} {resumo['p50_ms']:>9} {resumo['p95_ms']:>9} {resumo['p99_ms']:>9} "
+                f"{resumo['req_por_s']:>9} {resumo['queries_media']:>8}"
+            )
+
+        return resultado
+
+    def rotas(self):
+        """
+        Pares (view, ação) registrados em store/urls.py
+        """
+
+        rotas = set()
+        for _, viewset, _ in router.registry:
+            for acao in ('list', 'create', 'retrieve', 'update', 'destroy'):
+                if hasattr(viewset, acao):
+                    rotas.add((viewset.__name__, acao))
+        for padrao in urlpatterns:
+            acoes = getattr(padrao.callback, 'actions', None)
+            if acoes:
+                for acao in acoes.values():
+                    rotas.add((padrao.callback.cls.__name__, acao))
+        return rotas
+
+    def cenarios(self, client, rng):
+        """
+        Cenários do benchmark: nome -> ((view, ação), função medida, preparação)
+        """
+
+        produtos = list(Produto.objects.filter(estoque__gt=10).values_list('id', flat=True)[:1000])
+        clientes = list(Cliente.objects.values_list('id', flat=True)[:1000])
+        compras = list(Compra.objects.values_list('id', flat=True)[:1000])
+        cliente_carrinho = clientes[0]
+
+        def item_no_carrinho(i):
+            cliente = Cliente.objects.get(pk=rng.choice(clientes))
+            produto = Produto.objects.get(pk=rng.choice(produtos))
+            cliente.update_cart(produto, 1)
+            return (ItemCarrinho.objects.get(cliente=cliente, produto=produto),)
+
+        def carrinho_para_checkout(i):
+            cliente = Cliente.objects.get(pk=rng.choice(clientes))
+            cliente.clear_cart()
+            for produto in Produto.objects.filter(pk__in=rng.sample(produtos, 3)):
+                cliente.update_cart(produto, 1)
+            return (cliente.id,)
+
+        def novo_produto(i):
+            return (Produto.objects.create(nome=f'Benchmark {i}', descricao='Produto do benchmark', preco=10, estoque=100).id,)
+
+        def arquivo_importacao(i):
+            arquivo = io.BytesIO(''.join(
+                ['sku,nome,descricao,preco,estoque\n'] +
+                [f'BENCH-{i}-{j},Produto {j},Importado no benchmark,9.90,10\n' for j in range(100)]
+            ).encode())
+            arquivo.name = 'produtos.csv'
+            return (arquivo,)
+
+        def sem_cache(i):
+            cache.clear()
+            return ()
+
+        def nova_campanha(i):
+            agora = timezone.now()
+            campanha = CampanhaDesconto.objects.create(nome=f'Benchmark {i}', desconto=5, inicio=agora + timedelta(days=1), fim=agora + timedelta(days=2))
+            campanha.produtos.set(rng.sample(produtos, min(len(produtos), 100)))
+            return (campanha.id,)
+
+        def dados_campanha():
+            # Já começou: a criação aplica o desconto nos produtos na hora
+            agora = timezone.now()
+            return {
+                'nome': 'Benchmark', 'desconto': 5, 'inicio': (agora - timedelta(minutes=1)).isoformat(),
+                'fim': (agora + timedelta(hours=1)).isoformat(), 'produtos': [str(produto_id) for produto_id in rng.sample(produtos, min(len(produtos), 100))],
+            }
+
+        tarefa = {}
+
+        def enfileirar_desconto():
+            response = client.post('/store/produtos/aplicar_desconto', {'percentual_desconto': 10}, format='json')
+            tarefa['id'] = response.data['task_id']
+            return response
+
+        return {
+            'clientes.list': (('ClienteView', 'list'), lambda: client.get('/store/clientes/'), None),
+            'clientes.retrieve': (('ClienteView', 'retrieve'), lambda: client.get(f'/store/clientes/{rng.choice(clientes)}/'), None),
+            'clientes.create': (('ClienteView', 'create'), lambda: client.post('/store/clientes/', {
+                'nome': 'Benchmark', 'sobrenome': 'Teste', 'cpf_cnpj': f'{rng.randrange(10 ** 14):014d}',
+                'email': f'{rng.randrange(10 ** 12)}@benchmark.com', 'telefone': '11999999999', 'endereco': 'Rua 1',
+            }, format='json'), None),
+            'clientes.update': (('ClienteView', 'update'), lambda: client.put(f'/store/clientes/{rng.choice(clientes)}/', {'telefone': '11988887777'}, format='json'), None),
+            'clientes.compras': (('ClienteView', 'compras'), lambda: client.get(f'/store/clientes/{rng.choice(clientes)}/compras/'), None),
+            'clientes.destroy': (('ClienteView', 'destroy'), lambda: client.delete(f'/store/clientes/{clientes.pop()}/'), None),
+            'produtos.list': (('ProdutoView', 'list'), lambda: client.get('/store/produtos/'), sem_cache),
+            'produtos.list.cache': (('ProdutoView', 'list'), lambda: client.get('/store/produtos/'), None),
+            'produtos.list.filtro': (('ProdutoView', 'list'), lambda: client.get('/store/produtos/?min_preco=50&max_preco=200&em_estoque=true&ordering=preco'), sem_cache),
+            'produtos.list.campos': (('ProdutoView', 'list'), lambda: client.get('/store/produtos/?fields=id,nome,preco_final,estoque'), sem_cache),
+            'produtos.list.stream': (('ProdutoView', 'list'), lambda: b''.join(client.get('/store/produtos/?stream=1').streaming_content) and None, None),
+            'produtos.retrieve': (('ProdutoView', 'retrieve'), lambda: client.get(f'/store/produtos/{rng.choice(produtos)}/'), sem_cache),
+            'produtos.retrieve.cache': (('ProdutoView', 'retrieve'), lambda: client.get(f'/store/produtos/{produtos[0]}/'), None),
+            'produtos.busca': (('ProdutoView', 'busca'), lambda: client.get(f"/store/produtos/busca?q={rng.choice(['camiseta', 'calca azul', 'tenis preto', 'moleton'])}"), None),
+            'produtos.create': (('ProdutoView', 'create'), lambda: client.post('/store/produtos/', {'nome': 'Benchmark', 'descricao': 'Produto do benchmark', 'preco': 10, 'estoque': 5}, format='json'), None),
+            'produtos.update': (('ProdutoView', 'update'), lambda: client.put(f'/store/produtos/{rng.choice(produtos)}/', {'nome': 'Produto atualizado'}, format='json'), None),
+            'produtos.destroy': (('ProdutoView', 'destroy'), lambda produto_id: client.delete(f'/store/produtos/{produto_id}/'), novo_produto),
+            'produtos.importar': (('ProdutoView', 'importar'), lambda arquivo: client.post('/store/produtos/importar', {'arquivo': arquivo}, format='multipart'), arquivo_importacao),
+            'produtos.cache': (('ProdutoView', 'estatisticas_cache'), lambda: client.get('/store/produtos/cache'), None),
+            'produtos.aplicar_desconto': (('ProdutoView', 'aplicar_desconto'), enfileirar_desconto, None),
+            'produtos.status_desconto': (('ProdutoView', 'status_desconto'), lambda: client.get(f"/store/produtos/aplicar_desconto/{tarefa.get('id', 'x')}"), None),
+            'itens_carrinho.list': (('ItemCarrinhoView', 'list'), lambda: client.get(f'/store/itens_carrinho/?id_cliente={cliente_carrinho}'), None),
+            'itens_carrinho.retrieve': (('ItemCarrinhoView', 'retrieve'), lambda item: client.get(f'/store/itens_carrinho/{item.id}/'), item_no_carrinho),
+            'itens_carrinho.create': (('ItemCarrinhoView', 'create'), lambda: client.post('/store/itens_carrinho/', {'cliente_id': rng.choice(clientes), 'produto_id': str(rng.choice(produtos)), 'quantidade': 1}, format='json'), None),
+            'itens_carrinho.update': (('ItemCarrinhoView', 'update'), lambda item: client.put(f'/store/itens_carrinho/{item.id}/', {'cliente_id': item.cliente_id, 'quantidade': 2}, format='json'), item_no_carrinho),
+            'itens_carrinho.destroy': (('ItemCarrinhoView', 'destroy'), lambda item: client.delete(f'/store/itens_carrinho/{item.id}/'), item_no_carrinho),
+            'itens_carrinho.lote': (('ItemCarrinhoView', 'lote'), lambda: client.post('/store/itens_carrinho/lote', {
+                'cliente_id': rng.choice(clientes),
+                'itens': [{'produto_id': str(produto_id), 'quantidade': 1} for produto_id in rng.sample(produtos, 10)],
+            }, format='json'), None),
+            'compras.list': (('CompraView', 'list'), lambda: client.get('/store/compras/'), None),
+            'compras.list.campos': (('CompraView', 'list'), lambda: client.get('/store/compras/?fields=id,valor_total,itens.produto.id,itens.quantidade'), None),
+            'compras.list.stream': (('CompraView', 'list'), lambda: b''.join(client.get('/store/compras/?stream=1').streaming_content) and None, None),
+            'compras.retrieve': (('CompraView', 'retrieve'), lambda: client.get(f'/store/compras/{rng.choice(compras)}/'), None),
+            'compras.create': (('CompraView', 'create'), lambda cliente_id: client.post('/store/compras/', {'cliente_id': cliente_id}, format='json'), carrinho_para_checkout),
+            # Só a aceitação; o processamento fica na fila do Celery (broker em memória)
+            'compras.create_assincrono': (('CompraView', 'create'), lambda cliente_id: client.post('/store/compras/', {'cliente_id': cliente_id, 'assincrono': True}, format='json'), carrinho_para_checkout),
+            'analise.top_produtos': (('AnaliseView', 'top_produtos'), lambda: client.get('/store/analise/top_produtos'), None),
+            'analise.receita': (('AnaliseView', 'receita'), lambda: client.get('/store/analise/receita?agrupamento=mes'), None),
+            'analise.clientes': (('AnaliseView', 'clientes'), lambda: client.get('/store/analise/clientes'), None),
+            'campanhas.list': (('CampanhaView', 'list'), lambda: client.get('/store/campanhas/'), None),
+            'campanhas.create': (('CampanhaView', 'create'), lambda: client.post('/store/campanhas/', dados_campanha(), format='json'), None),
+            'campanhas.destroy': (('CampanhaView', 'destroy'), lambda campanha_id: client.delete(f'/store/campanhas/{campanha_id}/'), nova_campanha),
+            'metricas': (('MetricaView', 'list'), lambda: client.get('/store/metricas'), None),
+            'saude': (('SaudeView', 'list'), lambda: client.get('/store/saude'), None),
+        }
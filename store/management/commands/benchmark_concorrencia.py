@@ -0,0 +1,178 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from store import benchmark
+from store.models import Cliente, Compra, Produto
+
+
+class Command(BaseCommand):
+    help = 'Compara o throughput de requisições concorrentes em WSGI, ASGI com as views síncronas e ASGI com as views assíncronas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=2000)
+        parser.add_argument('--clientes', type=int, default=500)
+        parser.add_argument('--compras', type=int, default=5000)
+        parser.add_argument('--itens-por-compra', type=int, default=3)
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--concorrencia', type=int, default=32, help='Requisições simultâneas')
+        parser.add_argument('--requisicoes', type=int, default=1000, help='Total de requisições por modo')
+        parser.add_argument('--latencia-banco', type=float, default=0, help='Atraso artificial em ms por query, para simular um banco na rede')
+        parser.add_argument('--threads-banco', type=int, help='Tamanho do pool do banco das views assíncronas (padrão: ASYNC_THREADS_BANCO)')
+        parser.add_argument('--saida', help='Arquivo JSON onde o resultado será gravado')
+        parser.add_argument('--comparar', help='Resultado JSON anterior para comparar')
+        parser.add_argument('--manter-banco', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['threads_banco']:
+            settings.ASYNC_THREADS_BANCO = options['threads_banco']
+
+        tamanhos = {campo: options[campo] for campo in ('produtos', 'clientes', 'compras', 'itens_por_compra', 'semente')}
+        with benchmark.banco_de_teste(tamanhos, options['manter_banco'], self.stdout.write):
+            if options['latencia_banco']:
+                self.simular_latencia(options['latencia_banco'] / 1000)
+            resultado = self.executar(options)
+
+        if options['saida']:
+            benchmark.salvar(resultado, options['saida'])
+            self.stdout.write(f"Resultado gravado em {options['saida']}")
+
+        if options['comparar']:
+            self.stdout.write('\nDiferença em relação ao resultado anterior (%):')
+            for linha in benchmark.comparar(resultado, benchmark.carregar(options['comparar'])):
+                self.stdout.write(f"{linha.pop('cenario'):15} " + '  '.join(f'{campo}: {valor:+.1f}' for campo, valor in linha.items()))
+
+    def simular_latencia(self, segundos):
+        def atrasar(execute, sql, params, many, context):
+            time.sleep(segundos)
+            return execute(sql, params, many, context)
+
+        def instalar(sender, connection, **kwargs):
+            connection.execute_wrappers.append(atrasar)
+
+        # Vale para as conexões novas de qualquer thread e para a que já está aberta
+        connection_created.connect(instalar, weak=False)
+        if connection.connection is not None:
+            connection.execute_wrappers.append(atrasar)
+
+    def rotas(self):
+        """
+        As leituras que têm versão assíncrona, com ids reais do banco de teste
+        """
+
+        produtos = list(Produto.objects.values_list('id', flat=True)[:200])
+        clientes = list(Cliente.objects.values_list('id', flat=True)[:200])
+        compras = list(Compra.objects.values_list('id', flat=True)[:200])
+
+        rotas = []
+        for i in range(200):
+            rotas.append(('produtos/', f'tamanho_pagina={10 + i % 10}'))
+            rotas.append((f'produtos/{produtos[i % len(produtos)]}/', ''))
+            rotas.append(('itens_carrinho/', f'id_cliente={clientes[i % len(clientes)]}'))
+            rotas.append((f'compras/{compras[i % len(compras)]}/', ''))
+        return rotas
+
+    def executar(self, options):
+        cache.clear()
+        rotas = self.rotas()
+        concorrencia = options['concorrencia']
+        total = options['requisicoes']
+
+        resultado = {
+            'banco': connection.vendor,
+            'tamanho': {campo: options[campo] for campo in ('produtos', 'clientes', 'compras', 'itens_por_compra', 'semente')},
+            'concorrencia': concorrencia,
+            'requisicoes': total,
+            'latencia_banco_ms': options['latencia_banco'],
+            'threads_banco': settings.ASYNC_THREADS_BANCO,
+            'cenarios': {},
+        }
+
+        modos = {
+            'wsgi': lambda: self.medir_wsgi(rotas, concorrencia, total),
+            'asgi-sync': lambda: asyncio.run(self.medir_asgi(rotas, '/store/', concorrencia, total)),
+            'asgi-async': lambda: asyncio.run(self.medir_asgi(rotas, '/store/async/', concorrencia, total)),
+        }
+
+        self.stdout.write(f"\n{'modo':15} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for nome, medir in modos.items():
+            latencias, duracao = medir()
+            resumo = benchmark.resumir(latencias, duracao=duracao)
+            resultado['cenarios'][nome] = resumo
+            self.stdout.write(f"{nome:15} {resumo['req_por_s']:>9} {resumo['p50_ms']:>9} {resumo['p95_ms']:>9} {resumo['p99_ms']:>9}")
+
+        return resultado
+
+    def medir_wsgi(self, rotas, concorrencia, total):
+        """
+        Uma thread por requisição simultânea, como o runserver e os servidores WSGI com threads
+        """
+
+        handler = WSGIHandler()
+        fabrica = RequestFactory()
+
+        def requisitar(rota):
+            caminho, query = rota
+            environ = fabrica.get(f'/store/{caminho}', QUERY_STRING=query).environ
+            inicio = time.perf_counter()
+            status = []
+            resposta = handler(environ, lambda linha, cabecalhos, *args: status.append(linha))
+            b''.join(resposta)
+            resposta.close()
+            if int(status[0].split()[0]) >= 400:
+                raise AssertionError(f'{caminho}: {status[0]}')
+            return time.perf_counter() - inicio
+
+        fila = cycle(rotas)
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+            latencias = list(pool.map(requisitar, [next(fila) for _ in range(total)]))
+        return latencias, time.perf_counter() - inicio
+
+    async def medir_asgi(self, rotas, prefixo, concorrencia, total):
+        """
+        Chama a aplicação ASGI direto, com `concorrencia` requisições em andamento ao mesmo tempo
+        """
+
+        aplicacao = get_asgi_application()
+        fila = cycle(rotas)
+        restantes = [total]
+        latencias = []
+
+        async def requisitar(caminho, query):
+            escopo = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': f'{prefixo}{caminho}', 'raw_path': f'{prefixo}{caminho}'.encode(),
+                'query_string': query.encode(), 'root_path': '', 'headers': [(b'host', b'testserver')],
+                'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+            }
+            mensagens = []
+
+            async def receber():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def enviar(mensagem):
+                mensagens.append(mensagem)
+
+            inicio = time.perf_counter()
+            await aplicacao(escopo, receber, enviar)
+            latencias.append(time.perf_counter() - inicio)
+            if mensagens[0]['status'] >= 400:
+                raise AssertionError(f"{caminho}: {mensagens[0]['status']}")
+
+        async def trabalhador():
+            while restantes[0] > 0:
+                restantes[0] -= 1
+                await requisitar(*next(fila))
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+        return latencias, time.perf_counter() - inicio
@@ -0,0 +1,125 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from store import benchmark
+from store.checkout import finalizar_compra
+from store.estoque import rebalancear
+from store.models import Cliente, FaixaEstoque, ItemCarrinho, Produto
+
+
+def lista_de_inteiros(texto):
+    return [int(valor) for valor in texto.split(',') if valor.strip()]
+
+
+class Command(BaseCommand):
+    help = 'Mede o throughput de checkouts concorrentes de um mesmo produto, com e sem faixas de estoque'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--compradores', type=lista_de_inteiros, default=[1, 2, 4, 8, 16, 32], help='Compradores simultâneos, separados por vírgula')
+        parser.add_argument('--faixas', type=lista_de_inteiros, default=[0, 8], help='Faixas de estoque do produto (0 = sem faixas), separadas por vírgula')
+        parser.add_argument('--compras-por-comprador', type=int, default=20)
+        parser.add_argument('--latencia-banco', type=float, default=0, help='Atraso artificial em ms por query, para simular um banco na rede (as travas duram mais)')
+        parser.add_argument('--saida', help='Arquivo JSON onde o resultado será gravado')
+        parser.add_argument('--comparar', help='Resultado JSON anterior para comparar')
+        parser.add_argument('--manter-banco', action='store_true')
+
+    def handle(self, *args, **options):
+        tamanhos = {'produtos': 1, 'clientes': max(options['compradores']), 'compras': 0, 'itens_por_compra': 1, 'semente': 42}
+        with benchmark.banco_de_teste(tamanhos, options['manter_banco'], self.stdout.write):
+            if connection.vendor != 'postgresql':
+                self.stdout.write(self.style.WARNING(
+                    f'{connection.vendor} serializa todas as escritas; o ganho das faixas só aparece no PostgreSQL'
+                ))
+            if options['latencia_banco']:
+                self.simular_latencia(options['latencia_banco'] / 1000)
+            resultado = self.executar(options)
+
+        if options['saida']:
+            benchmark.salvar(resultado, options['saida'])
+            self.stdout.write(f"Resultado gravado em {options['saida']}")
+
+        if options['comparar']:
+            self.stdout.write('\nDiferença em relação ao resultado anterior (%):')
+            for linha in benchmark.comparar(resultado, benchmark.carregar(options['comparar'])):
+                self.stdout.write(f"{linha.pop('cenario'):28} " + '  '.join(f'{campo}: {valor:+.1f}' for campo, valor in linha.items()))
+
+    def simular_latencia(self, segundos):
+        def atrasar(execute, sql, params, many, context):
+            time.sleep(segundos)
+            return execute(sql, params, many, context)
+
+        def instalar(sender, connection, **kwargs):
+            connection.execute_wrappers.append(atrasar)
+
+        # As threads dos compradores abrem conexões novas
+        connection_created.connect(instalar, weak=False)
+
+    def executar(self, options):
+        cache.clear()
+        produto = Produto.objects.create(nome='Produto em promoção', descricao='Produto disputado', preco=100, estoque=0)
+        clientes = list(Cliente.objects.order_by('id')[:max(options['compradores'])])
+
+        resultado = {
+            'banco': connection.vendor,
+            'compras_por_comprador': options['compras_por_comprador'],
+            'latencia_banco_ms': options['latencia_banco'],
+            'cenarios': {},
+        }
+
+        self.stdout.write(f"\n{'faixas':>6} {'compradores':>11} {'compras/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for faixas in options['faixas']:
+            for compradores in options['compradores']:
+                produto = self.preparar(produto, faixas, compradores * options['compras_por_comprador'])
+                latencias, duracao = self.medir(produto, clientes[:compradores], options)
+                resumo = benchmark.resumir(latencias, duracao=duracao)
+                resultado['cenarios'][f'faixas={faixas} compradores={compradores}'] = resumo
+                self.stdout.write(
+                    f"{faixas:>6} {compradores:>11} {resumo['req_por_s']:>10} {resumo['p50_ms']:>9} "
+                    f"{resumo['p95_ms']:>9} {resumo['p99_ms']:>9}"
+                )
+
+        return resultado
+
+    def preparar(self, produto, faixas, compras):
+        """
+        Estoque de sobra para todas as compras, dividido em faixas
+        """
+
+        ItemCarrinho.objects.all().delete()
+        FaixaEstoque.objects.filter(produto=produto).delete()
+        Produto.objects.filter(pk=produto.pk).update(estoque=compras * 2, reservado=0, faixas_estoque=faixas)
+        rebalancear(produto.pk)
+        return Produto.objects.get(pk=produto.pk)
+
+    def medir(self, produto, clientes, options):
+        """
+        Cada comprador, em sua thread e conexão, coloca uma unidade no carrinho e finaliza a compra
+        """
+
+        compras = options['compras_por_comprador']
+        # O SQLite dos testes (em memória, cache compartilhado) falha em vez de
+        # esperar quando outra conexão está escrevendo; lá as compras entram uma por vez
+        trava = threading.Lock() if connection.vendor == 'sqlite' else nullcontext()
+
+        def comprar(cliente):
+            latencias = []
+            try:
+                for _ in range(compras):
+                    inicio = time.perf_counter()
+                    with trava:
+                        cliente.update_cart(produto, 1)
+                        finalizar_compra(cliente)
+                    latencias.append(time.perf_counter() - inicio)
+            finally:
+                connection.close()
+            return latencias
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(clientes)) as pool:
+            latencias = [latencia for parcial in pool.map(comprar, clientes) for latencia in parcial]
+        return latencias, time.perf_counter() - inicio
@@ -0,0 +1,110 @@
+import time
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from store import benchmark
+from store.estoque import totais
+from store.models import Produto
+from store.renderers import OrjsonRenderer
+from store.serializers import projetar_produtos, serializar_produtos
+
+
+def lista_de_inteiros(texto):
+    return [int(valor) for valor in texto.split(',') if valor.strip()]
+
+
+def por_instancias(linhas):
+    """
+    Como a listagem de produtos era montada: models inteiros, campo a campo
+    """
+
+    produtos = list(Produto.objects.order_by('nome', 'id')[:linhas])
+    estoques = totais(produtos)
+    return [
+        {
+            'id': produto.id,
+            'sku': produto.sku,
+            'nome': produto.nome,
+            'descricao': produto.descricao,
+            'preco': produto.preco,
+            'estoque': estoques[produto.id][0],
+            'desconto': produto.desconto,
+            'preco_final': produto.preco_final,
+        }
+        for produto in produtos
+    ]
+
+
+def por_projecao(linhas):
+    return serializar_produtos(list(projetar_produtos(Produto.objects.order_by('nome', 'id'))[:linhas]))
+
+
+class Command(BaseCommand):
+    help = 'Compara a montagem e a codificação JSON da listagem de produtos: models + JSONRenderer do DRF contra values() + orjson'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=5000)
+        parser.add_argument('--linhas', type=lista_de_inteiros, default=[50, 500, 2000], help='Tamanhos de página, separados por vírgula')
+        parser.add_argument('--repeticoes', type=int, default=50)
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--saida', help='Arquivo JSON onde o resultado será gravado')
+        parser.add_argument('--comparar', help='Resultado JSON anterior para comparar')
+        parser.add_argument('--manter-banco', action='store_true')
+
+    def handle(self, *args, **options):
+        tamanhos = {'produtos': options['produtos'], 'clientes': 0, 'compras': 0, 'itens_por_compra': 1, 'semente': options['semente']}
+        with benchmark.banco_de_teste(tamanhos, options['manter_banco'], self.stdout.write):
+            resultado = self.executar(options)
+
+        if options['saida']:
+            benchmark.salvar(resultado, options['saida'])
+            self.stdout.write(f"Resultado gravado em {options['saida']}")
+
+        if options['comparar']:
+            self.stdout.write('\nDiferença em relação ao resultado anterior (%):')
+            for linha in benchmark.comparar(resultado, benchmark.carregar(options['comparar'])):
+                self.stdout.write(f"{linha.pop('cenario'):32} " + '  '.join(f'{campo}: {valor:+.1f}' for campo, valor in linha.items()))
+
+    def executar(self, options):
+        variantes = {
+            'instancias+drf': (por_instancias, JSONRenderer()),
+            'instancias+orjson': (por_instancias, OrjsonRenderer()),
+            'projecao+drf': (por_projecao, JSONRenderer()),
+            'projecao+orjson': (por_projecao, OrjsonRenderer()),
+        }
+        resultado = {'produtos': options['produtos'], 'repeticoes': options['repeticoes'], 'cenarios': {}}
+
+        self.stdout.write(f"\n{'cenario':32} {'p50 ms':>9} {'p95 ms':>9} {'leitura':>9} {'json':>9}")
+        for linhas in options['linhas']:
+            base = None
+            for nome, (montar, renderer) in variantes.items():
+                resumo, leitura, codificacao = self.medir(montar, renderer, linhas, options['repeticoes'])
+                resumo['leitura_p50_ms'] = leitura['p50_ms']
+                resumo['json_p50_ms'] = codificacao['p50_ms']
+                base = base or resumo['p50_ms']
+                resumo['ganho'] = round(base / resumo['p50_ms'], 2) if resumo['p50_ms'] else None
+
+                cenario = f'{nome} linhas={linhas}'
+                resultado['cenarios'][cenario] = resumo
+                self.stdout.write(
+                    f"{cenario:32} {resumo['p50_ms']:>9} {resumo['p95_ms']:>9} "
+                    f"{resumo['leitura_p50_ms']:>9} {resumo['json_p50_ms']:>9}  x{resumo['ganho']}"
+                )
+
+        return resultado
+
+    def medir(self, montar, renderer, linhas, repeticoes):
+        """
+        Tempo total, da leitura (query + montagem) e da codificação de cada repetição
+        """
+
+        totais_, leituras, codificacoes = [], [], []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            data = montar(linhas)
+            meio = time.perf_counter()
+            renderer.render({'resultados': data, 'proximo': None, 'tamanho_pagina': linhas})
+            fim = time.perf_counter()
+            totais_.append(fim - inicio)
+            leituras.append(meio - inicio)
+            codificacoes.append(fim - meio)
+        return benchmark.resumir(totais_), benchmark.resumir(leituras), benchmark.resumir(codificacoes)
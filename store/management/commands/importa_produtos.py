@@ -0,0 +1,30 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from store.importacao import importar_produtos
+
+class Command(BaseCommand):
+    help = 'Importa produtos de um arquivo CSV ou JSONL, criando ou atualizando pelo SKU'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do arquivo CSV ou JSONL')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help='Formato do arquivo (padrão: pela extensão)')
+        parser.add_argument('--lote', type=int, help='Quantidade de produtos gravados por transação')
+        parser.add_argument('--rejeitados', help='Arquivo JSONL onde as linhas rejeitadas serão gravadas')
+
+    def handle(self, *args, **options):
+        arquivo = options['arquivo']
+        formato = options['formato'] or arquivo.rsplit('.', 1)[-1].lower()
+        if formato not in ('csv', 'jsonl'):
+            raise CommandError('Informe o formato com --formato csv ou --formato jsonl')
+
+        with open(arquivo, encoding='utf-8', newline='') as entrada:
+            relatorio = importar_produtos(entrada, formato, tamanho_lote=options['lote'])
+
+        if options['rejeitados']:
+            with open(options['rejeitados'], 'w', encoding='utf-8') as saida:
+                for erro in relatorio['erros']:
+                    saida.write(json.dumps(erro, ensure_ascii=False) + '\n')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{relatorio['criados']} produtos criados, {relatorio['atualizados']} atualizados e {relatorio['rejeitados']} linhas rejeitadas"
+        ))
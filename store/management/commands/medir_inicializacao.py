@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from store import benchmark
+
+# Roda em um processo novo, como um worker do servidor recém-criado
+SCRIPT = '''
+import json, resource, time
+inicio = time.perf_counter()
+from projeto_trainee.wsgi import application
+carregado = time.perf_counter()
+from django.test import RequestFactory
+status = []
+resposta = application(RequestFactory().get('/store/saude').environ, lambda linha, cabecalhos, *args: status.append(linha))
+b''.join(resposta)
+resposta.close()
+fim = time.perf_counter()
+print(json.dumps({
+    'carregar': carregado - inicio,
+    'primeira_requisicao': fim - carregado,
+    'status': status[0],
+    'memoria_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Mede o tempo de inicialização de um worker (carregar o Django e responder a primeira requisição) e a memória usada'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=10)
+
+    def handle(self, *args, **options):
+        ambiente = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        medidas = []
+        for _ in range(options['repeticoes']):
+            saida = subprocess.run([sys.executable, '-c', SCRIPT], env=ambiente, cwd=settings.BASE_DIR, capture_output=True, text=True, check=True)
+            medidas.append(json.loads(saida.stdout.strip().splitlines()[-1]))
+
+        for campo in ('carregar', 'primeira_requisicao'):
+            resumo = benchmark.resumir([medida[campo] for medida in medidas])
+            self.stdout.write(f"{campo:20} p50 {resumo['p50_ms']:>9} ms   p95 {resumo['p95_ms']:>9} ms")
+        memoria = max(medida['memoria_mb'] for medida in medidas)
+        self.stdout.write(f"{'memoria':20} {memoria:.1f} MB por worker")
+        self.stdout.write(f"{'status':20} {medidas[-1]['status']}")
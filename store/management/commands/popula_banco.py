@@ -1,10 +1,38 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from store.dados_sinteticos import gerar, DadosJaGerados
 from store.models import Produto, Cliente, Compra, ItemCompra
 
 class Command(BaseCommand):
-    help = 'Popula o banco de dados com dados iniciais'
+    help = 'Popula o banco de dados com dados iniciais ou com um conjunto sintético em escala'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, help='Quantidade de produtos sintéticos')
+        parser.add_argument('--clientes', type=int, default=1000, help='Quantidade de clientes sintéticos')
+        parser.add_argument('--compras', type=int, default=10000, help='Quantidade de compras sintéticas')
+        parser.add_argument('--itens-por-compra', type=int, default=3, help='Itens sorteados por compra')
+        parser.add_argument('--semente', type=int, default=42, help='Semente do gerador (mesma semente, mesmos dados)')
+        parser.add_argument('--lote', type=int, default=5000, help='Linhas gravadas por bulk_create')
+        parser.add_argument('--dias', type=int, default=365, help='Período, em dias, em que as compras são distribuídas')
 
     def handle(self, *args, **kwargs):
+        if kwargs['produtos']:
+            try:
+                gerar(
+                    produtos=kwargs['produtos'],
+                    clientes=kwargs['clientes'],
+                    compras=kwargs['compras'],
+                    itens_por_compra=kwargs['itens_por_compra'],
+                    semente=kwargs['semente'],
+                    tamanho_lote=kwargs['lote'],
+                    dias=kwargs['dias'],
+                    log=self.stdout.write,
+                )
+            except DadosJaGerados as e:
+                raise CommandError(str(e))
+
+            self.stdout.write(self.style.SUCCESS('Dados sintéticos inseridos com sucesso!'))
+            return
+
         # Produtos
         camiseta = Produto.objects.create(nome='Camiseta', descricao='Camiseta branca', preco=29.90, estoque=100)
         calca = Produto.objects.create(nome='Calça', descricao='Calça jeans', preco=59.90, estoque=50)
@@ -33,4 +61,4 @@ class Command(BaseCommand):
         joao_compra.add_item(produto=sapato, quantidade=1)
         maria_compra.add_item(produto=meia, quantidade=2)
 
-        self.stdout.write(self.style.SUCCESS('Dados inseridos com sucesso!'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('Dados inseridos com sucesso!'))
@@ -0,0 +1,268 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Limites (em segundos, queries e bytes) dos buckets dos histogramas
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_QUERIES = (1, 2, 5, 10, 20, 50, 100, 200)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+BUCKETS_TAREFAS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+
+PREFIXO_TAREFAS = 'store:metricas:tarefa'
+PREFIXO_REQUISICOES = 'store:metricas:requisicao'
+
+
+class Histograma:
+    """
+    Histograma cumulativo no formato do Prometheus, compartilhado pelos processos
+
+    As observações se acumulam na memória do processo e de tempos em tempos
+    (enviar, chamado por uma thread do processo) são somadas a contadores no
+    cache (Redis), que todos os workers do servidor usam. A leitura (linhas) é
+    dos contadores, então qualquer worker que responder em /store/metricas
+    mostra o total.
+    """
+
+    def __init__(self, nome, descricao, buckets):
+        self.nome = nome
+        self.descricao = descricao
+        self.buckets = buckets
+        # Observações ainda não enviadas ao cache
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observar(self, rotulo, valor):
+        posicao = bisect.bisect_left(self.buckets, valor)
+        with self.lock:
+            serie = self.series.get(rotulo)
+            if serie is None:
+                serie = self.series[rotulo] = [[0] * (len(self.buckets) + 1), 0, 0]
+            serie[0][posicao] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def _chave(self, rotulo, campo):
+        return f'{PREFIXO_REQUISICOES}:{self.nome}:{rotulo}:{campo}'
+
+    def enviar(self):
+        """
+        Soma as observações pendentes aos contadores do cache; a soma vai em milionésimos
+        """
+
+        with self.lock:
+            series, self.series = self.series, {}
+        if not series:
+            return
+
+        incrementos = {}
+        for rotulo, (contagens, soma, total) in series.items():
+            for posicao, contagem in enumerate(contagens):
+                if contagem:
+                    incrementos[self._chave(rotulo, f'bucket:{posicao}')] = contagem
+            incrementos[self._chave(rotulo, 'soma_u')] = int(soma * 1_000_000)
+            incrementos[self._chave(rotulo, 'total')] = total
+        _somar_varios(incrementos, f'{PREFIXO_REQUISICOES}:{self.nome}:rotulos', series)
+
+    def linhas(self, nome_rotulo):
+        yield f'# HELP {self.nome} {self.descricao}'
+        yield f'# TYPE {self.nome} histogram'
+        rotulos = _membros(f'{PREFIXO_REQUISICOES}:{self.nome}:rotulos')
+        campos = [f'bucket:{posicao}' for posicao in range(len(self.buckets) + 1)] + ['soma_u', 'total']
+        valores = cache.get_many([self._chave(rotulo, campo) for rotulo in rotulos for campo in campos])
+        for rotulo in rotulos:
+            valor = lambda campo: valores.get(self._chave(rotulo, campo), 0)
+            contagens = [valor(f'bucket:{posicao}') for posicao in range(len(self.buckets) + 1)]
+            yield from _serie(self.nome, nome_rotulo, rotulo, self.buckets, contagens, valor('soma_u') / 1_000_000, valor('total'))
+
+
+def _serie(nome, nome_rotulo, rotulo, buckets, contagens, soma, total):
+    acumulado = 0
+    for limite, contagem in zip(buckets, contagens):
+        acumulado += contagem
+        yield f'{nome}_bucket{{{nome_rotulo}="{rotulo}",le="{limite}"}} {acumulado}'
+    yield f'{nome}_bucket{{{nome_rotulo}="{rotulo}",le="+Inf"}} {total}'
+    yield f'{nome}_sum{{{nome_rotulo}="{rotulo}"}} {round(soma, 6)}'
+    yield f'{nome}_count{{{nome_rotulo}="{rotulo}"}} {total}'
+
+
+duracao = Histograma('store_requisicao_duracao_segundos', 'Tempo total da requisição', BUCKETS_SEGUNDOS)
+tempo_view = Histograma('store_requisicao_view_segundos', 'Tempo dentro da view (sem renderização)', BUCKETS_SEGUNDOS)
+tempo_banco = Histograma('store_requisicao_banco_segundos', 'Tempo gasto em queries', BUCKETS_SEGUNDOS)
+queries = Histograma('store_requisicao_queries', 'Número de queries por requisição', BUCKETS_QUERIES)
+tamanho_resposta = Histograma('store_resposta_bytes', 'Tamanho do corpo da resposta', BUCKETS_BYTES)
+
+HISTOGRAMAS_REQUISICAO = (duracao, tempo_view, tempo_banco, queries, tamanho_resposta)
+
+
+_envio = {'pid': None}
+_envio_lock = threading.Lock()
+
+
+def intervalo_envio():
+    return getattr(settings, 'METRICAS_INTERVALO_ENVIO_SEGUNDOS', 5)
+
+
+def _iniciar_envio():
+    """
+    Inicia a thread que envia as métricas a cada intervalo, uma por processo
+
+    O pid é conferido porque threads não sobrevivem ao fork dos workers.
+    """
+
+    pid = os.getpid()
+    if _envio['pid'] == pid:
+        return
+    with _envio_lock:
+        if _envio['pid'] == pid:
+            return
+        _envio['pid'] = pid
+        threading.Thread(target=_enviar_periodicamente, name='envio-metricas', daemon=True).start()
+
+
+def _enviar_periodicamente():
+    while True:
+        time.sleep(intervalo_envio())
+        enviar()
+
+
+def enviar():
+    """
+    Envia ao cache as observações das requisições que ainda estão na memória do processo
+    """
+
+    try:
+        for histograma in HISTOGRAMAS_REQUISICAO:
+            histograma.enviar()
+    except Exception:
+        # Métricas não derrubam a requisição; o que estava pendente se perde
+        logger.exception('Falha ao enviar as métricas das requisições ao cache')
+
+
+def registrar_requisicao(view, total, view_segundos, banco, numero_queries, tamanho):
+    duracao.observar(view, total)
+    tempo_view.observar(view, view_segundos)
+    tempo_banco.observar(view, banco)
+    queries.observar(view, numero_queries)
+    if tamanho is not None:
+        tamanho_resposta.observar(view, tamanho)
+    # O envio ao cache fica com a thread, fora do tempo da requisição
+    _iniciar_envio()
+
+
+def _chave_tarefa(tarefa, campo):
+    return f'{PREFIXO_TAREFAS}:{tarefa}:{campo}'
+
+
+def _redis():
+    """
+    Cliente do Redis por trás do cache (django-redis), ou None em outros backends
+    """
+
+    cliente = getattr(cache, 'client', None)
+    return cliente.get_client(write=True) if hasattr(cliente, 'get_client') else None
+
+
+def _somar(chave, valor):
+    try:
+        cache.incr(chave, valor)
+    except ValueError:
+        if not cache.add(chave, valor, timeout=None):
+            cache.incr(chave, valor)
+
+
+def _somar_varios(incrementos, chave_conjunto, membros):
+    """
+    Soma {chave: valor} aos contadores e adiciona os membros ao conjunto chave_conjunto
+
+    No Redis vai tudo em um pipeline (uma ida ao servidor), com INCRBY e SADD,
+    que são atômicos entre os workers. Os outros backends (locmem nos testes)
+    só servem a um processo e usam incr e get/set.
+    """
+
+    redis = _redis()
+    if redis is None:
+        for chave, valor in incrementos.items():
+            _somar(chave, valor)
+        atuais = cache.get(chave_conjunto) or []
+        if not set(membros) <= set(atuais):
+            cache.set(chave_conjunto, sorted(set(atuais) | set(membros)), timeout=None)
+        return
+
+    pipeline = redis.pipeline(transaction=False)
+    for chave, valor in incrementos.items():
+        pipeline.incrby(cache.make_key(chave), valor)
+    pipeline.sadd(cache.make_key(chave_conjunto), *membros)
+    pipeline.execute()
+
+
+def _membros(chave_conjunto):
+    redis = _redis()
+    if redis is None:
+        return cache.get(chave_conjunto) or []
+    return sorted(membro.decode() for membro in redis.smembers(cache.make_key(chave_conjunto)))
+
+
+def registrar_tarefa(tarefa, segundos, linhas=None, sucesso=True):
+    """
+    Registra a execução de uma tarefa do Celery
+
+    O worker roda em outro processo, então as métricas das tarefas ficam em
+    contadores no cache (Redis) em vez da memória, para o endpoint de métricas
+    da API conseguir ler. Os tempos são somados em microssegundos.
+    """
+
+    posicao = bisect.bisect_left(BUCKETS_TAREFAS, segundos)
+    incrementos = {
+        _chave_tarefa(tarefa, f'bucket:{posicao}'): 1,
+        _chave_tarefa(tarefa, 'soma_us'): int(segundos * 1_000_000),
+        _chave_tarefa(tarefa, 'execucoes' if sucesso else 'falhas'): 1,
+    }
+    if linhas:
+        incrementos[_chave_tarefa(tarefa, 'linhas')] = linhas
+    _somar_varios(incrementos, f'{PREFIXO_TAREFAS}:nomes', [tarefa])
+
+
+def _linhas_tarefas():
+    nomes = _membros(f'{PREFIXO_TAREFAS}:nomes')
+    campos = [f'bucket:{posicao}' for posicao in range(len(BUCKETS_TAREFAS) + 1)] + ['soma_us', 'execucoes', 'falhas', 'linhas']
+    valores = cache.get_many([_chave_tarefa(nome, campo) for nome in nomes for campo in campos])
+
+    duracoes = ['# HELP store_tarefa_duracao_segundos Duração das tarefas do Celery', '# TYPE store_tarefa_duracao_segundos histogram']
+    contadores = {
+        'execucoes': ['# HELP store_tarefa_execucoes_total Tarefas concluídas', '# TYPE store_tarefa_execucoes_total counter'],
+        'falhas': ['# HELP store_tarefa_falhas_total Tarefas que terminaram com erro', '# TYPE store_tarefa_falhas_total counter'],
+        'linhas': ['# HELP store_tarefa_linhas_total Linhas processadas pelas tarefas', '# TYPE store_tarefa_linhas_total counter'],
+    }
+    for nome in nomes:
+        valor = lambda campo: valores.get(_chave_tarefa(nome, campo), 0)
+        contagens = [valor(f'bucket:{posicao}') for posicao in range(len(BUCKETS_TAREFAS) + 1)]
+        duracoes.extend(_serie('store_tarefa_duracao_segundos', 'tarefa', nome, BUCKETS_TAREFAS, contagens, valor('soma_us') / 1_000_000, sum(contagens)))
+        for campo, linhas in contadores.items():
+            linhas.append(f'store_tarefa_{campo}_total{{tarefa="{nome}"}} {valor(campo)}')
+
+    yield from duracoes
+    for linhas in contadores.values():
+        yield from linhas
+
+
+def exportar():
+    """
+    Todas as métricas no formato texto do Prometheus
+
+    As métricas das requisições são a soma de todos os workers do servidor,
+    lida do cache; a thread de cada worker envia as suas a cada
+    METRICAS_INTERVALO_ENVIO_SEGUNDOS e o que respondeu envia as pendentes antes.
+    """
+
+    enviar()
+    linhas = []
+    for histograma in HISTOGRAMAS_REQUISICAO:
+        linhas.extend(histograma.linhas('view'))
+    linhas.extend(_linhas_tarefas())
+    return '\n'.join(linhas) + '\n'
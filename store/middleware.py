@@ -0,0 +1,131 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from store import metricas
+
+# Medição da requisição em andamento; as threads que rodam as queries recebem
+# uma cópia do contexto (sync_to_async e store.assincrono.no_banco)
+_medicao_atual = ContextVar('medicao_requisicao', default=None)
+
+
+def nome_view(request):
+    """
+    Nome da view no formato View.ação (ex.: CompraView.list)
+    """
+
+    resolver = getattr(request, 'resolver_match', None)
+    if resolver is None:
+        return 'nao_encontrada'
+    classe = getattr(resolver.func, 'cls', None)
+    acoes = getattr(resolver.func, 'actions', None)
+    if classe and acoes:
+        return f'{classe.__name__}.{acoes.get(request.method.lower(), request.method.lower())}'
+    return resolver.view_name
+
+
+class MedicaoRequisicao:
+    """
+    Acumula o tempo e o número de queries de uma requisição
+
+    Custa só uma chamada a perf_counter por query e funciona com DEBUG desligado.
+    """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.queries = 0
+        self.banco = 0.0
+        self.fim_view = None
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.banco += time.perf_counter() - inicio
+            self.queries += 1
+
+
+def medir_query(execute, sql, params, many, context):
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    return medicao(execute, sql, params, many, context)
+
+
+def instalar_medicao(sender, connection, **kwargs):
+    """
+    Instala medir_query em cada conexão nova (sinal connection_created)
+
+    Fica em todas as conexões, de qualquer thread, e só mede quando a query
+    roda dentro de uma requisição.
+    """
+
+    if medir_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(medir_query)
+
+
+class MetricasMiddleware:
+    """
+    Mede cada requisição: queries, tempo de banco, tempo da view e tamanho da resposta
+
+    Os valores vão para o header Server-Timing da resposta e para os
+    histogramas expostos em /store/metricas. Funciona em WSGI e ASGI, sem
+    forçar as views assíncronas a rodar em uma thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = asyncio.iscoroutinefunction(get_response)
+        if self.assincrono:
+            # Marca a instância como corrotina, como o MiddlewareMixin do Django faz
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        medicao, token = self.iniciar(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicao_atual.reset(token)
+        return self.finalizar(request, medicao, response)
+
+    async def __acall__(self, request):
+        medicao, token = self.iniciar(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicao_atual.reset(token)
+        return self.finalizar(request, medicao, response)
+
+    def iniciar(self, request):
+        medicao = MedicaoRequisicao()
+        request._medicao = medicao
+        return medicao, _medicao_atual.set(medicao)
+
+    def finalizar(self, request, medicao, response):
+        total = time.perf_counter() - medicao.inicio
+
+        # Respostas do DRF são renderizadas depois da view; o tempo da view para
+        # em process_template_response e o resto é renderização
+        fim_view = medicao.fim_view or total
+        renderizacao = total - fim_view
+        tamanho = None if response.streaming else len(response.content)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={medicao.banco * 1000:.2f};desc="{medicao.queries} queries"',
+            f'view;dur={(fim_view - medicao.banco) * 1000:.2f}',
+            f'render;dur={renderizacao * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        metricas.registrar_requisicao(nome_view(request), total, fim_view, medicao.banco, medicao.queries, tamanho)
+        return response
+
+    def process_template_response(self, request, response):
+        medicao = getattr(request, '_medicao', None)
+        if medicao is not None:
+            medicao.fim_view = time.perf_counter() - medicao.inicio
+        return response
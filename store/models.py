@@ -1,32 +1,111 @@
 import uuid
 from django.db import models
+from django.utils import timezone
 from django.db.models import Sum, F
+from store.cache import invalidar_compras, invalidar_produtos
+from store.precos import calcular_preco_final
+
+# Produtos com estoque na própria linha ou quentes (o estoque está nas faixas)
+EM_ESTOQUE = models.Q(estoque__gt=0) | models.Q(faixas_estoque__gt=0)
+
+# Produtos com disponível (estoque - reservado) na própria linha ou quentes; é a
+# condição dos índices parciais usados pelo filtro em_estoque da listagem
+DISPONIVEL = models.Q(estoque__gt=F('reservado')) | models.Q(faixas_estoque__gt=0)
+
+# Campos do produto que aparecem nas compras ou mudam o preço delas; um save
+# só com outros campos (ex.: estoque) não invalida as compras em cache
+CAMPOS_CADASTRO = {'nome', 'preco', 'desconto'}
+
 
 class Produto(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    sku = models.CharField(max_length=50, unique=True, null=True, blank=True)
     nome = models.CharField(max_length=100)
     descricao = models.TextField()
     preco = models.DecimalField(max_digits=10, decimal_places=2)
     estoque = models.IntegerField()
     desconto = models.IntegerField(default=0)
+    # Maior desconto entre as campanhas ativas do produto (CampanhaDesconto)
+    desconto_campanha = models.IntegerField(default=0)
+    # Preço com o desconto vigente, recalculado sempre que preço ou descontos mudam
+    preco_final = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Unidades reservadas por carrinhos; o disponível para venda é estoque - reservado
+    reservado = models.IntegerField(default=0)
+    # Produto quente: o estoque é dividido em faixas (FaixaEstoque) para as
+    # compras concorrentes não disputarem a mesma linha; 0 desliga
+    faixas_estoque = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['nome', 'id'], name='produto_nome_id_idx'),
+            models.Index(fields=['preco_final', 'id'], name='produto_preco_final_id_idx'),
+            models.Index(fields=['nome', 'id'], name='produto_disponivel_nome_idx', condition=DISPONIVEL),
+            models.Index(fields=['preco_final', 'id'], name='produto_disponivel_preco_idx', condition=DISPONIVEL),
+        ]
 
     def __str__(self):
         return self.nome
+
+    def save(self, *args, **kwargs):
+        self.preco_final = calcular_preco_final(self.preco, self.desconto_vigente)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'preco', 'desconto', 'desconto_campanha'} & set(update_fields):
+            kwargs['update_fields'] = [*update_fields, 'preco_final']
+        super().save(*args, **kwargs)
+        # Só muda o que as compras mostram se o save pode ter mexido nesses campos
+        invalidar_produtos([self.pk], cadastro=update_fields is None or bool(CAMPOS_CADASTRO & set(update_fields)))
+
+    @property
+    def desconto_vigente(self):
+        return max(self.desconto, self.desconto_campanha)
+
+    def preco_com_desconto(self):
+        return self.preco_final
     
     def add_estoque(self, quantidade):
         self.estoque += quantidade
-        self.save()
+        self.save(update_fields=['estoque'])
 
     def remove_estoque(self, quantidade):
         self.estoque -= quantidade
         if self.estoque < 0:
             self.estoque = 0
-        self.save()
+        self.save(update_fields=['estoque'])
+
+class FaixaEstoque(models.Model):
+    """
+    Parte do estoque de um produto quente
+
+    O estoque do produto é o da linha em Produto mais o de todas as faixas.
+    """
+
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
+    numero = models.IntegerField()
+    estoque = models.IntegerField(default=0)
+    reservado = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['produto', 'numero'], name='faixa_estoque_unica'),
+        ]
+
 
 class ItemCarrinho(models.Model):
     cliente = models.ForeignKey('Cliente', on_delete=models.CASCADE)
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
     quantidade = models.IntegerField()
+    # Até quando a quantidade está reservada no estoque; nulo quando a reserva expirou
+    reservado_ate = models.DateTimeField(null=True, blank=True)
+    # Onde está a reserva: {faixa: quantidade}, 0 é a linha do produto; vazio sem reserva
+    divisao = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cliente', 'produto'], name='item_carrinho_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['reservado_ate'], name='item_carrinho_reserva_idx'),
+        ]
 
     def subtotal(self):
         return self.produto.preco * self.quantidade
@@ -47,51 +126,75 @@ class Cliente(models.Model):
         return self.nome
     
     def update_cart(self, produto, quantidade):
-        item = ItemCarrinho.objects.filter(cliente=self, produto=produto).first()
-        quantidade = min(quantidade, produto.estoque)
-        if item:
-            if quantidade > 0:
-                item.quantidade = quantidade
-                item.save()
-            else:
-                item.delete()
-            
-        else:
-            if quantidade > 0:
-                ItemCarrinho.objects.create(cliente=self, produto=produto, quantidade=quantidade)
+        # Reserva até o disponível; o import evita o ciclo com store.reservas
+        from store.reservas import reservar
+        reservar(self, {produto.pk: max(quantidade, 0)}, ajustar=True, faixas={produto.pk: produto.faixas_estoque})
     
     def clear_cart(self):
-        ItemCarrinho.objects.filter(cliente=self).delete()
+        from store.reservas import remover_itens
+        remover_itens(ItemCarrinho.objects.filter(cliente=self))
 
 class ItemCompra(models.Model):
-    compra = models.ForeignKey('Compra', on_delete=models.CASCADE)
+    # Sem o índice da FK: item_compra_compra_produto_idx começa por compra e já atende as buscas por ela
+    compra = models.ForeignKey('Compra', on_delete=models.CASCADE, db_index=False)
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
     preco_unidade = models.DecimalField(max_digits=10, decimal_places=2)
     quantidade = models.IntegerField()
     desconto_aplicado = models.IntegerField(default=0)
+    # Divisão da reserva trazida do carrinho enquanto a compra está pendente; nula se não havia reserva
+    divisao_reserva = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['compra', 'produto'], name='item_compra_compra_produto_idx'),
+        ]
 
     def subtotal(self):
         return self.preco_unidade * self.quantidade
 
 class Compra(models.Model):
+    CONCLUIDA = 'concluida'
+    PENDENTE = 'pendente'
+    RECUSADA = 'recusada'
+    STATUS = [
+        (CONCLUIDA, 'Concluída'),
+        (PENDENTE, 'Pendente'),
+        (RECUSADA, 'Recusada'),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
-    data_compra = models.DateTimeField(auto_now_add=True)
+    data_compra = models.DateTimeField(default=timezone.now)
     valor_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Compras do checkout assíncrono ficam pendentes até o estoque ser baixado
+    status = models.CharField(max_length=10, choices=STATUS, default=CONCLUIDA)
+    motivo = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['data_compra', 'id'], name='compra_data_id_idx'),
+            # Histórico de um cliente: busca por cliente e faixa de datas, ordenada por data
+            models.Index(fields=['cliente', 'data_compra', 'id'], name='compra_cliente_data_idx'),
+            # Fila do checkout assíncrono; só as pendentes entram no índice
+            models.Index(fields=['data_compra', 'id'], name='compra_pendente_idx', condition=models.Q(status='pendente')),
+        ]
 
     def __str__(self):
         itens = ItemCompra.objects.filter(compra=self)
         itens_str = ', '.join([f'{item.quantidade}x {item.produto.nome}' for item in itens])
         return f'{self.cliente.nome} comprou {itens_str}'
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidar_compras([self.pk])
+
     def add_item(self, produto, quantidade):
         item = ItemCompra.objects.filter(compra=self, produto=produto).first()
         if item:
             item.quantidade += quantidade
             item.save()
         else:
-            preco_com_desconto = produto.preco - ((produto.preco * produto.desconto) / 100)
-            ItemCompra.objects.create(compra=self, produto=produto, preco_unidade=preco_com_desconto, quantidade=quantidade, desconto_aplicado=produto.desconto)
+            ItemCompra.objects.create(compra=self, produto=produto, preco_unidade=produto.preco_final, quantidade=quantidade, desconto_aplicado=produto.desconto_vigente)
             
         produto.remove_estoque(quantidade)
         self.valor_total = self.total()
@@ -103,3 +206,67 @@ class Compra(models.Model):
             total=Sum(F('preco_unidade') * F('quantidade'))
         )['total'] or 0
         return total
+
+
+class CampanhaDesconto(models.Model):
+    """
+    Desconto para vários produtos entre inicio e fim
+
+    O celery beat ativa e expira a campanha (store.campanhas); enquanto ativa,
+    o desconto vale para os produtos se for maior que o desconto deles.
+    """
+
+    nome = models.CharField(max_length=100)
+    desconto = models.IntegerField()
+    inicio = models.DateTimeField()
+    fim = models.DateTimeField()
+    produtos = models.ManyToManyField(Produto, related_name='campanhas')
+    # Se o desconto já está aplicado nos preços dos produtos
+    ativa = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['inicio'], name='campanha_inicio_idx'),
+            models.Index(fields=['fim'], name='campanha_fim_idx'),
+        ]
+
+    def __str__(self):
+        return self.nome
+
+
+class VendaProdutoDia(models.Model):
+    """
+    Quantidade vendida e receita de cada produto por dia
+    """
+
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
+    dia = models.DateField()
+    quantidade = models.IntegerField(default=0)
+    receita = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['produto', 'dia'], name='venda_produto_dia_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['dia'], name='venda_produto_dia_idx'),
+        ]
+
+
+class GastoClienteMes(models.Model):
+    """
+    Quantidade de compras e valor gasto por cada cliente por mês
+    """
+
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
+    mes = models.DateField()  # primeiro dia do mês
+    compras = models.IntegerField(default=0)
+    valor = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cliente', 'mes'], name='gasto_cliente_mes_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['mes'], name='gasto_cliente_mes_idx'),
+        ]
@@ -0,0 +1,135 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def _valor(linha, campo):
+    if isinstance(linha, dict):
+        return linha[campo]
+    return getattr(linha, campo)
+
+
+def _serializar_valor(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, (UUID, Decimal)):
+        return str(valor)
+    return valor
+
+
+def codificar_cursor(valores):
+    bruto = json.dumps([_serializar_valor(valor) for valor in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, quantidade):
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valores = json.loads(bruto)
+    except (binascii.Error, ValueError):
+        raise CursorInvalido('Cursor inválido')
+
+    if not isinstance(valores, list) or len(valores) != quantidade:
+        raise CursorInvalido('Cursor inválido')
+    return valores
+
+
+def total_aproximado(queryset):
+    """
+    Estimativa do número de linhas sem rodar COUNT(*)
+
+    No PostgreSQL usa a estimativa do planejador, nos outros bancos cai no count()
+    """
+
+    if connections[queryset.db].vendor == 'postgresql':
+        plano = json.loads(queryset.order_by().explain(format='json'))
+        return int(plano[0]['Plan']['Plan Rows'])
+    return queryset.count()
+
+
+class PaginacaoPorCursor:
+    """
+    Paginação por cursor (keyset) com ordenação estável
+
+    O cursor guarda os valores da ordenação da última linha da página, então a
+    próxima página é uma busca por faixa no índice e não um OFFSET.
+    Campos com prefixo '-' são ordenados de forma decrescente.
+    """
+
+    def __init__(self, ordenacao):
+        self.ordenacao = tuple(ordenacao)
+
+    def tamanho_pagina(self, request):
+        padrao = getattr(settings, 'PAGINACAO_TAMANHO_PADRAO', 50)
+        maximo = getattr(settings, 'PAGINACAO_TAMANHO_MAXIMO', 500)
+        tamanho = request.query_params.get('tamanho_pagina')
+        if tamanho is None:
+            return padrao
+        try:
+            tamanho = int(tamanho)
+        except ValueError:
+            raise CursorInvalido('tamanho_pagina deve ser um número inteiro')
+        if tamanho <= 0:
+            raise CursorInvalido('tamanho_pagina deve ser maior que 0')
+        return min(tamanho, maximo)
+
+    def filtro_apos(self, valores):
+        """
+        Monta o filtro das linhas que vêm depois dos valores do cursor
+        """
+
+        filtro = Q()
+        iguais = {}
+        for campo, valor in zip(self.ordenacao, valores):
+            nome = campo.lstrip('-')
+            operador = 'lt' if campo.startswith('-') else 'gt'
+            filtro |= Q(**iguais, **{f'{nome}__{operador}': valor})
+            iguais[nome] = valor
+        return filtro
+
+    def paginar(self, request, queryset):
+        """
+        Retorna as linhas da página e os metadados da paginação
+        """
+
+        tamanho = self.tamanho_pagina(request)
+        cursor = request.query_params.get('cursor')
+        modo_total = request.query_params.get('total')
+        if modo_total not in (None, 'aproximado', 'exato'):
+            raise CursorInvalido("total deve ser 'aproximado' ou 'exato'")
+
+        pagina = queryset.order_by(*self.ordenacao)
+
+        # Um cursor que decodifica mas tem valores do tipo errado falha no filtro ou na query
+        try:
+            if cursor:
+                pagina = pagina.filter(self.filtro_apos(decodificar_cursor(cursor, len(self.ordenacao))))
+            linhas = list(pagina[:tamanho + 1])
+        except (ValueError, TypeError, ValidationError):
+            raise CursorInvalido('Cursor inválido')
+
+        proximo = None
+        if len(linhas) > tamanho:
+            linhas = linhas[:tamanho]
+            ultima = linhas[-1]
+            proximo = codificar_cursor([_valor(ultima, campo.lstrip('-')) for campo in self.ordenacao])
+
+        meta = {'proximo': proximo, 'tamanho_pagina': tamanho}
+        if modo_total == 'exato':
+            meta['total'] = queryset.count()
+        elif modo_total == 'aproximado':
+            meta['total'] = total_aproximado(queryset)
+
+        return linhas, meta
@@ -0,0 +1,46 @@
+from decimal import Decimal, ROUND_HALF_UP
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Greatest, Round
+
+
+def calcular_preco_final(preco, desconto):
+    """
+    Preço com o desconto em porcentagem, arredondado para centavos
+    """
+
+    preco = Decimal(preco)
+    preco = preco - (preco * desconto) / 100
+    return preco.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def desconto_vigente(desconto=None):
+    """
+    O maior entre o desconto do produto e o da campanha ativa, em SQL
+    """
+
+    return Greatest(desconto or F('desconto'), F('desconto_campanha'))
+
+
+def expressao_preco_final(desconto=None):
+    """
+    calcular_preco_final em SQL, para recalcular muitos produtos em um update
+
+    desconto substitui o desconto do produto, para o update que muda os dois.
+
+    Arredonda preço * (100 - desconto), que tem no máximo 2 casas, e só então
+    divide por 100: dá o mesmo resultado de arredondar para centavos e não
+    depende de divisão decimal no banco (o SQLite divide inteiros truncando).
+    """
+
+    return ExpressionWrapper(
+        Round(F('preco') * (Value(100) - desconto_vigente(desconto))) / Value(100),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def recalcular_precos(produtos):
+    """
+    Atualiza preco_final de um queryset de produtos com um único update
+    """
+
+    return produtos.update(preco_final=expressao_preco_final())
@@ -0,0 +1,163 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from store import estoque
+from store.cache import invalidar_produtos
+from store.models import ItemCarrinho, Produto
+from store.upsert import upsert
+
+
+def validade():
+    return timezone.now() + timedelta(seconds=getattr(settings, 'RESERVA_TTL_SEGUNDOS', 900))
+
+
+def _liberar(divisoes):
+    """
+    divisoes é {produto_id: divisão da reserva}
+    """
+
+    for produto_id in sorted(divisoes, key=str):
+        estoque.liberar(produto_id, divisoes[produto_id])
+    # O disponível dos produtos aparece nas respostas em cache
+    invalidar_produtos(divisoes, cadastro=False)
+
+
+def _reservar(produto_id, nova, item, faixas):
+    """
+    Leva a reserva do item para nova; retorna a divisão da reserva ou None se não coube
+    """
+
+    atual = estoque.ler_divisao(item.divisao) if item and item.reservado_ate else {}
+    reservada = sum(atual.values())
+
+    if nova == reservada:
+        return atual
+    if nova < reservada:
+        solta, fica = estoque.separar(atual, reservada - nova)
+        estoque.liberar(produto_id, solta)
+        return fica
+
+    # Só a diferença é reservada, onde houver disponível
+    extra = estoque.consumir(produto_id, nova - reservada, reservar=True, faixas=faixas)
+    return None if extra is None else estoque.somar(atual, extra)
+
+
+def _reservar_maximo(produto_id, item, faixas):
+    """
+    Aumenta a reserva do item com todo o disponível do produto
+
+    Retorna a nova quantidade e a divisão.
+    """
+
+    atual = estoque.ler_divisao(item.divisao) if item and item.reservado_ate else {}
+    while True:
+        livre = estoque.disponivel(produto_id, faixas)
+        extra = estoque.consumir(produto_id, livre, reservar=True, faixas=faixas) if livre else {}
+        if extra is not None:
+            divisao = estoque.somar(atual, extra)
+            return sum(divisao.values()), divisao
+
+
+def reservar(cliente, quantidades, ajustar=False, faixas=None):
+    """
+    Define a quantidade de cada produto no carrinho reservando o estoque
+
+    quantidades é {produto_id: nova quantidade}; 0 remove o item e libera a
+    reserva. A reserva vale por RESERVA_TTL_SEGUNDOS e é renovada a cada
+    alteração do item. Com ajustar=True, se não houver disponível suficiente
+    reserva o máximo possível.
+    faixas é {produto_id: faixas_estoque}, para quem já leu os produtos.
+    Retorna {produto_id: quantidade no carrinho}, com None para os produtos
+    sem disponível (o item fica como estava).
+    """
+
+    resultado = {}
+    if not quantidades:
+        return resultado
+    if faixas is None:
+        faixas = dict(Produto.objects.filter(pk__in=list(quantidades)).values_list('id', 'faixas_estoque'))
+
+    with transaction.atomic():
+        atuais = {
+            item.produto_id: item
+            for item in ItemCarrinho.objects.select_for_update().filter(cliente=cliente, produto_id__in=list(quantidades))
+        }
+        ate = validade()
+        gravar = []
+        remover = []
+
+        # Sempre na mesma ordem para evitar deadlock entre carrinhos
+        for produto_id in sorted(quantidades, key=str):
+            nova = quantidades[produto_id]
+            item = atuais.get(produto_id)
+
+            divisao = _reservar(produto_id, nova, item, faixas.get(produto_id, 0))
+            if divisao is None:
+                if not ajustar:
+                    resultado[produto_id] = None
+                    continue
+                nova, divisao = _reservar_maximo(produto_id, item, faixas.get(produto_id, 0))
+
+            resultado[produto_id] = nova
+            if nova > 0:
+                gravar.append({'cliente': cliente.pk, 'produto': produto_id, 'quantidade': nova, 'reservado_ate': ate, 'divisao': divisao})
+            elif item:
+                remover.append(produto_id)
+
+        upsert(ItemCarrinho, gravar, chave=('cliente', 'produto'), campos=('quantidade', 'reservado_ate', 'divisao'))
+        if remover:
+            ItemCarrinho.objects.filter(cliente=cliente, produto_id__in=remover).delete()
+        invalidar_produtos([produto_id for produto_id, nova in resultado.items() if nova is not None], cadastro=False)
+
+    return resultado
+
+
+def remover_itens(itens):
+    """
+    Apaga os itens do carrinho (queryset) e libera as reservas que eles tinham
+    """
+
+    with transaction.atomic():
+        divisoes = defaultdict(dict)
+        for produto_id, divisao in itens.select_for_update().filter(reservado_ate__isnull=False).values_list('produto_id', 'divisao'):
+            divisoes[produto_id] = estoque.somar(divisoes[produto_id], estoque.ler_divisao(divisao))
+        _liberar(divisoes)
+        itens.delete()
+
+
+def expirar_reservas(tamanho_lote=None):
+    """
+    Libera as reservas vencidas em lotes, mantendo os itens no carrinho
+
+    Cada lote é uma transação: trava os itens (pulando os que um checkout
+    está usando), devolve as quantidades ao disponível com um update por
+    produto (e faixa) e marca os itens como sem reserva. Retorna quantos itens expiraram.
+    """
+
+    tamanho_lote = tamanho_lote or getattr(settings, 'RESERVA_TAMANHO_LOTE', 1000)
+    agora = timezone.now()
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            lote = list(
+                ItemCarrinho.objects
+                .select_for_update(skip_locked=True)
+                .filter(reservado_ate__lt=agora)
+                .order_by('reservado_ate')
+                .values_list('id', 'produto_id', 'divisao')[:tamanho_lote]
+            )
+            if not lote:
+                break
+
+            divisoes = defaultdict(dict)
+            for _, produto_id, divisao in lote:
+                divisoes[produto_id] = estoque.somar(divisoes[produto_id], estoque.ler_divisao(divisao))
+            _liberar(divisoes)
+            ItemCarrinho.objects.filter(id__in=[linha[0] for linha in lote]).update(reservado_ate=None, divisao={})
+
+        total += len(lote)
+
+    return total
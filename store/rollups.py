@@ -0,0 +1,126 @@
+from collections import defaultdict
+from django.db import connection, transaction
+from django.db.models import Count, DateField, DecimalField, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+from store.models import GastoClienteMes, ItemCompra, Compra, VendaProdutoDia
+from store.upsert import upsert
+
+TAMANHO_LOTE = 5000
+
+
+def receita_item():
+    return Sum(F('preco_unidade') * F('quantidade'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def registrar_venda(compra, itens):
+    """
+    Soma a compra nas tabelas de rollup
+
+    Deve ser chamada na mesma transação que cria a compra, assim os rollups
+    nunca ficam com uma compra que foi desfeita.
+    """
+
+    registrar_vendas([(compra, itens)])
+
+
+def registrar_vendas(compras):
+    """
+    Soma várias compras [(compra, itens)] nos rollups com dois upserts
+    """
+
+    vendas = defaultdict(lambda: [0, 0])
+    gastos = defaultdict(lambda: [0, 0])
+    for compra, itens in compras:
+        dia = timezone.localdate(compra.data_compra)
+        for item in itens:
+            venda = vendas[(item.produto_id, dia)]
+            venda[0] += item.quantidade
+            venda[1] += item.subtotal()
+        gasto = gastos[(compra.cliente_id, dia.replace(day=1))]
+        gasto[0] += 1
+        gasto[1] += compra.valor_total
+
+    upsert(
+        VendaProdutoDia,
+        [
+            {'produto': produto_id, 'dia': dia, 'quantidade': quantidade, 'receita': receita}
+            for (produto_id, dia), (quantidade, receita) in vendas.items()
+        ],
+        chave=('produto', 'dia'),
+        campos=('quantidade', 'receita'),
+        somar=True,
+    )
+    upsert(
+        GastoClienteMes,
+        [
+            {'cliente': cliente_id, 'mes': mes, 'compras': quantidade, 'valor': valor}
+            for (cliente_id, mes), (quantidade, valor) in gastos.items()
+        ],
+        chave=('cliente', 'mes'),
+        campos=('compras', 'valor'),
+        somar=True,
+    )
+
+
+def _recriar(model, linhas, criar):
+    model.objects.all().delete()
+    total = 0
+    lote = []
+    for linha in linhas:
+        lote.append(criar(linha))
+        if len(lote) >= TAMANHO_LOTE:
+            model.objects.bulk_create(lote)
+            total += len(lote)
+            lote = []
+    model.objects.bulk_create(lote)
+    return total + len(lote)
+
+
+def reconstruir():
+    """
+    Recalcula os rollups a partir de ItemCompra e Compra
+
+    Retorna o número de linhas gravadas nas duas tabelas.
+    """
+
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # Segura os checkouts que tentarem somar nos rollups até o fim da reconstrução
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'LOCK TABLE {VendaProdutoDia._meta.db_table}, {GastoClienteMes._meta.db_table} IN EXCLUSIVE MODE'
+                )
+
+        # Compras pendentes ou recusadas não entram nos rollups
+        vendas = (
+            ItemCompra.objects
+            .filter(compra__status=Compra.CONCLUIDA)
+            .annotate(dia=TruncDate('compra__data_compra'))
+            .values('produto_id', 'dia')
+            .annotate(total_quantidade=Sum('quantidade'), total_receita=receita_item())
+            .order_by()
+        )
+        linhas = _recriar(VendaProdutoDia, vendas.iterator(chunk_size=TAMANHO_LOTE), lambda linha: VendaProdutoDia(
+            produto_id=linha['produto_id'],
+            dia=linha['dia'],
+            quantidade=linha['total_quantidade'],
+            receita=linha['total_receita'],
+        ))
+
+        gastos = (
+            Compra.objects
+            .filter(status=Compra.CONCLUIDA)
+            .annotate(mes=TruncMonth('data_compra', output_field=DateField()))
+            .values('cliente_id', 'mes')
+            .annotate(total_compras=Count('id'), total_valor=Sum('valor_total'))
+            .order_by()
+        )
+        linhas += _recriar(GastoClienteMes, gastos.iterator(chunk_size=TAMANHO_LOTE), lambda linha: GastoClienteMes(
+            cliente_id=linha['cliente_id'],
+            mes=linha['mes'],
+            compras=linha['total_compras'],
+            valor=linha['total_valor'],
+        ))
+
+    return linhas
@@ -1,6 +1,36 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
+from store import estoque
+from store.campos import podar, quer, selecionados, subcampos
 from .models import Produto, Cliente, ItemCompra, ItemCarrinho, Compra
 
+# Colunas das respostas de produtos e clientes, na ordem do JSON
+CAMPOS_PRODUTO = ('id', 'sku', 'nome', 'descricao', 'preco', 'estoque', 'disponivel', 'desconto', 'preco_final')
+CAMPOS_CLIENTE = ('id', 'nome', 'sobrenome', 'cpf_cnpj', 'email', 'telefone', 'endereco')
+
+# Campos que cada rota aceita em ?fields= (None é um campo sem subcampos)
+ESQUEMA_PRODUTO = dict.fromkeys(CAMPOS_PRODUTO)
+ESQUEMA_CLIENTE = dict.fromkeys(CAMPOS_CLIENTE)
+ESQUEMA_COMPRA = {
+    'id': None,
+    'status': None,
+    'cliente_cpf_cnpj': None,
+    'itens': {
+        'produto': {'id': None, 'nome': None, 'preco': None},
+        'desconto_aplicado': None,
+        'quantidade': None,
+        'subtotal': None,
+    },
+    'valor_total': None,
+    'motivo': None,
+}
+ESQUEMA_ITEM_CARRINHO = {
+    'id': None,
+    'produto': {'id': None, 'nome': None, 'preco': None, 'desconto': None, 'preco_final': None},
+    'quantidade': None,
+    'reservado_ate': None,
+}
+
 class ProdutoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Produto
@@ -25,3 +55,161 @@ class CompraSerializer(serializers.ModelSerializer):
     class Meta:
         model = Compra
         fields = '__all__'
+
+
+def projetar_produtos(queryset, campos=None, extras=()):
+    """
+    Lê só as colunas pedidas, em dicionários, sem instanciar os models
+
+    campos é a árvore de ?fields= (store.campos). extras são colunas lidas mas
+    não devolvidas, como as da ordenação do cursor.
+    """
+
+    colunas = {'id', *selecionados(campos, CAMPOS_PRODUTO), *extras}
+    # disponivel não é coluna: sai de estoque - reservado
+    if colunas & {'estoque', 'disponivel'}:
+        colunas |= {'estoque', 'reservado', 'faixas_estoque'}
+        colunas.discard('disponivel')
+    return queryset.values(*colunas)
+
+
+def serializar_produtos(linhas, campos=None):
+    """
+    Monta a resposta a partir das linhas de projetar_produtos
+
+    O disponível é o estoque menos as reservas ativas. Estoque e disponível dos
+    produtos quentes somam os das faixas (uma query, só se houver algum).
+    """
+
+    nomes = selecionados(campos, CAMPOS_PRODUTO)
+    faixas = {}
+    if 'estoque' in nomes or 'disponivel' in nomes:
+        faixas = estoque.nas_faixas([linha['id'] for linha in linhas if linha['faixas_estoque']])
+
+    data = []
+    for linha in linhas:
+        if 'estoque' in linha:
+            estoque_faixas, reservado_faixas = faixas.get(linha['id'], (0, 0))
+            linha = {
+                **linha,
+                'estoque': linha['estoque'] + estoque_faixas,
+                'disponivel': linha['estoque'] + estoque_faixas - linha['reservado'] - reservado_faixas,
+            }
+        data.append({campo: linha[campo] for campo in nomes})
+    return data
+
+
+def prefetch_itens(campos=None):
+    """
+    Itens das compras só com as colunas pedidas; o join com o produto só entra pelo nome
+    """
+
+    itens = ItemCompra.objects.all()
+    colunas = ['compra', 'preco_unidade', 'quantidade', 'desconto_aplicado']
+    if quer(campos, 'produto') and quer(subcampos(campos, 'produto'), 'nome'):
+        itens = itens.select_related('produto')
+        colunas += ['produto__id', 'produto__nome']
+    else:
+        colunas.append('produto')
+    return Prefetch('itemcompra_set', queryset=itens.only(*colunas).order_by('id'))
+
+
+def projetar_compras(queryset, campos=None):
+    """
+    Compras só com as colunas pedidas e o cliente só se o CPF/CNPJ foi pedido
+    """
+
+    if quer(campos, 'cliente_cpf_cnpj'):
+        queryset = queryset.select_related('cliente')
+    if campos is not None:
+        # id e data_compra sempre, por causa da ordenação do cursor
+        colunas = ['id', 'data_compra', *selecionados(campos, ('status', 'valor_total', 'motivo'))]
+        if quer(campos, 'cliente_cpf_cnpj'):
+            colunas.append('cliente__cpf_cnpj')
+        queryset = queryset.only(*colunas)
+    return queryset
+
+
+def compras_com_itens(queryset, campos=None):
+    """
+    Carrega as compras junto com cliente, itens e produtos
+
+    São no máximo duas queries (compras + clientes e itens + produtos),
+    independente da quantidade de compras e de itens. Com campos, só o que
+    foi pedido é lido: sem itens não há a segunda query.
+    """
+
+    queryset = projetar_compras(queryset, campos)
+    if quer(campos, 'itens'):
+        queryset = queryset.prefetch_related(prefetch_itens(subcampos(campos, 'itens')))
+    return queryset
+
+
+def serializar_item_compra(item, campos=None):
+    data = {}
+    if quer(campos, 'produto'):
+        produto = subcampos(campos, 'produto')
+        data['produto'] = {}
+        if quer(produto, 'id'):
+            data['produto']['id'] = item.produto_id
+        if quer(produto, 'nome'):
+            data['produto']['nome'] = item.produto.nome
+        if quer(produto, 'preco'):
+            data['produto']['preco'] = item.preco_unidade
+    if quer(campos, 'desconto_aplicado'):
+        data['desconto_aplicado'] = item.desconto_aplicado
+    if quer(campos, 'quantidade'):
+        data['quantidade'] = item.quantidade
+    if quer(campos, 'subtotal'):
+        data['subtotal'] = item.subtotal()
+    return data
+
+
+def serializar_compra(compra, campos=None):
+    """
+    Monta o dicionário de resposta de uma compra carregada por compras_com_itens
+    """
+
+    data = {}
+    if quer(campos, 'id'):
+        data['id'] = compra.id
+    if quer(campos, 'status'):
+        data['status'] = compra.status
+    if quer(campos, 'cliente_cpf_cnpj'):
+        data['cliente_cpf_cnpj'] = compra.cliente.cpf_cnpj
+    if quer(campos, 'itens'):
+        data['itens'] = [serializar_item_compra(item, subcampos(campos, 'itens')) for item in compra.itemcompra_set.all()]
+    if quer(campos, 'valor_total'):
+        data['valor_total'] = compra.valor_total
+    if quer(campos, 'motivo') and compra.motivo:
+        data['motivo'] = compra.motivo
+    return data
+
+
+def serializar_compras(compras, campos=None):
+    return [serializar_compra(compra, campos) for compra in compras]
+
+
+def itens_carrinho(queryset, campos=None):
+    """
+    Itens do carrinho com o produto na mesma query, só se ele foi pedido
+    """
+
+    if quer(campos, 'produto'):
+        queryset = queryset.select_related('produto')
+    return queryset
+
+
+def serializar_item_carrinho(item, campos=None):
+    data = {'id': item.id}
+    if quer(campos, 'produto'):
+        data['produto'] = {
+            'id': item.produto.id,
+            'nome': item.produto.nome,
+            'preco': item.produto.preco,
+            'desconto': item.produto.desconto,
+            'preco_final': item.produto.preco_final,
+        }
+    data['quantidade'] = item.quantidade
+    data['reservado_ate'] = item.reservado_ate
+    return podar(data, campos)
@@ -0,0 +1,89 @@
+from itertools import islice
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from store.campos import quer, subcampos
+from store.renderers import json_bytes
+from store.serializers import prefetch_itens, projetar_compras, projetar_produtos, serializar_compras, serializar_produtos
+
+
+# O ASGIHandler do Django 3.2 percorre o corpo das respostas em streaming no
+# event loop, onde o ORM não pode rodar: a resposta morreria no meio
+SO_WSGI = 'O streaming (?stream=1) só está disponível no servidor WSGI'
+
+
+def em_asgi(request):
+    """
+    Se a requisição (do Django ou do DRF) chegou por um servidor ASGI
+    """
+
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+def tamanho_lote():
+    return getattr(settings, 'STREAMING_TAMANHO_LOTE', 2000)
+
+
+def _json_em_partes(linhas, tamanho_buffer=64 * 1024):
+    """
+    Gera um array JSON em pedaços de até ~64KB, sem montar a lista inteira
+    """
+
+    yield b'['
+
+    partes = []
+    tamanho = 0
+    separador = b''
+    for linha in linhas:
+        parte = separador + json_bytes(linha)
+        separador = b','
+        partes.append(parte)
+        tamanho += len(parte)
+        if tamanho >= tamanho_buffer:
+            yield b''.join(partes)
+            partes = []
+            tamanho = 0
+
+    partes.append(b']')
+    yield b''.join(partes)
+
+
+def resposta_em_streaming(linhas):
+    response = StreamingHttpResponse(_json_em_partes(linhas), content_type='application/json')
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def produtos_em_lotes(queryset, campos=None):
+    """
+    Lê os produtos com cursor do lado do servidor (no PostgreSQL), em lotes
+
+    O estoque dos produtos quentes de cada lote soma o das faixas, como na
+    listagem paginada, com no máximo uma query a mais por lote.
+    """
+
+    tamanho = tamanho_lote()
+    linhas = projetar_produtos(queryset, campos).order_by('nome', 'id').iterator(chunk_size=tamanho)
+    while True:
+        lote = list(islice(linhas, tamanho))
+        if not lote:
+            break
+        yield from serializar_produtos(lote, campos)
+
+
+def compras_em_lotes(queryset, campos=None):
+    """
+    Lê as compras com cursor do lado do servidor e carrega os itens de cada lote
+    em uma query, então são 1 + (compras / tamanho do lote) queries no total
+    """
+
+    tamanho = tamanho_lote()
+    compras = projetar_compras(queryset, campos).order_by('data_compra', 'id').iterator(chunk_size=tamanho)
+    while True:
+        lote = list(islice(compras, tamanho))
+        if not lote:
+            break
+        if quer(campos, 'itens'):
+            prefetch_related_objects(lote, prefetch_itens(subcampos(campos, 'itens')))
+        yield from serializar_compras(lote, campos)
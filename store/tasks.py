@@ -1,21 +1,123 @@
+import time
 from decimal import Decimal
 from celery import shared_task
-from store.models import Produto
+from celery.signals import task_prerun, task_postrun
+from django.conf import settings
+from django.db import OperationalError
+from django.db.models import Value
+from store.cache import invalidar_produtos
+from store import campanhas, checkout_em_lote, estoque, metricas, reservas, rollups
+from store.models import EM_ESTOQUE, Produto
+from store.precos import expressao_preco_final
 
-@shared_task
-def atualizar_desconto(percentual_desconto):
+@shared_task(bind=True, autoretry_for=(OperationalError,), retry_backoff=True, max_retries=3)
+def atualizar_desconto(self, percentual_desconto, tamanho_lote=None):
     """
     Atualiza os preços dos produtos
+
+    O desconto é aplicado com updates em lotes de ids. Produtos que já estão com
+    o desconto ficam de fora, então uma nova tentativa continua de onde parou.
+    O progresso fica no estado da tarefa ('PROGRESS' com processados e total).
+    """
+
+    percentual_desconto = int(Decimal(percentual_desconto))
+    tamanho_lote = tamanho_lote or getattr(settings, 'DESCONTO_TAMANHO_LOTE', 1000)
+
+    # Filtra os produtos que possuem estoque (na linha ou nas faixas) e ainda não têm o desconto
+    pendentes = Produto.objects.filter(EM_ESTOQUE).exclude(desconto=percentual_desconto)
+    total = pendentes.count()
+    processados = 0
+    ultimo_id = None
+
+    while True:
+        lote = pendentes.order_by('id')
+        if ultimo_id is not None:
+            lote = lote.filter(id__gt=ultimo_id)
+        ids = list(lote.values_list('id', flat=True)[:tamanho_lote])
+        if not ids:
+            break
+
+        processados += Produto.objects.filter(pk__in=ids).exclude(desconto=percentual_desconto).update(
+            desconto=percentual_desconto, preco_final=expressao_preco_final(Value(percentual_desconto)),
+        )
+        invalidar_produtos(ids, cadastro=False)
+        ultimo_id = ids[-1]
+
+        if self.request.id:
+            self.update_state(state='PROGRESS', meta={'processados': processados, 'total': total})
+
+    return {
+        'message': f'Desconto de {percentual_desconto}% aplicado para {processados} produtos',
+        'processados': processados,
+        'total': total,
+    }
+
+
+@shared_task
+def reconstruir_rollups():
+    """
+    Recalcula as tabelas de rollup de vendas a partir das compras
+    """
+
+    linhas = rollups.reconstruir()
+    return {'message': 'Rollups de vendas reconstruídos', 'processados': linhas}
+
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=3)
+def expirar_reservas():
+    """
+    Devolve ao estoque disponível as reservas de carrinho vencidas (agendada no beat)
     """
 
-    # Filtra os produtos que possuem estoque
-    produtos = Produto.objects.filter(estoque__gt=0)
+    expirados = reservas.expirar_reservas()
+    return {'message': f'{expirados} reservas expiradas', 'processados': expirados}
+
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=3)
+def rebalancear_faixas_estoque():
+    """
+    Redistribui o estoque livre entre as faixas dos produtos quentes (agendada no beat)
+    """
+
+    produtos = estoque.rebalancear_todos()
+    return {'message': f'{produtos} produtos rebalanceados', 'processados': produtos}
+
+
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=3)
+def processar_compras_pendentes():
+    """
+    Baixa o estoque das compras do checkout assíncrono em lotes agrupados por produto
+    """
+
+    processadas = checkout_em_lote.processar_pendentes()
+    return {'message': f'{processadas} compras processadas', 'processados': processadas}
+
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=3)
+def atualizar_campanhas():
+    """
+    Ativa as campanhas de desconto que começaram e expira as que terminaram
+    """
+
+    alteradas = campanhas.atualizar_campanhas()
+    return {'message': f'{alteradas} campanhas atualizadas', 'processados': alteradas}
+
+
+# Duração e linhas processadas de cada tarefa, para o endpoint de métricas
+_inicios = {}
+
+
+@task_prerun.connect
+def _inicio_tarefa(task_id=None, **kwargs):
+    _inicios[task_id] = time.perf_counter()
+
 
-    for produto in produtos:
-        try:
-            produto.desconto = percentual_desconto
-            produto.save()
-        except Exception as e:
-            print(f'Erro ao atualizar preço do produto {produto.id}: {e}')
+@task_postrun.connect
+def _fim_tarefa(task_id=None, task=None, retval=None, state=None, **kwargs):
+    inicio = _inicios.pop(task_id, None)
+    if inicio is None:
+        return
+    linhas = retval.get('processados') if isinstance(retval, dict) else None
+    metricas.registrar_tarefa(task.name.rsplit('.', 1)[-1], time.perf_counter() - inicio, linhas, sucesso=state == 'SUCCESS')
 
-    return f'Desconto de {percentual_desconto}% aplicado para {produtos.count()} produtos'
\ No newline at end of file
@@ -0,0 +1,45 @@
+from django.db import connection
+
+
+def upsert(model, linhas, chave, campos, somar=False):
+    """
+    INSERT ... ON CONFLICT DO UPDATE de várias linhas em um único comando
+
+    linhas é uma lista de dicionários com os campos de chave e de campos.
+    Com somar=True os valores são somados aos que já existem na linha, senão
+    são substituídos. A chave precisa ter uma UniqueConstraint no model.
+    Funciona no PostgreSQL e no SQLite (3.24+).
+    """
+
+    if not linhas:
+        return
+
+    qn = connection.ops.quote_name
+    tabela = qn(model._meta.db_table)
+    fields = [model._meta.get_field(nome) for nome in (*chave, *campos)]
+    colunas = [qn(field.column) for field in fields]
+    colunas_chave = colunas[:len(chave)]
+    colunas_campos = colunas[len(chave):]
+
+    if somar:
+        atualizacoes = [f'{coluna} = {tabela}.{coluna} + EXCLUDED.{coluna}' for coluna in colunas_campos]
+    else:
+        atualizacoes = [f'{coluna} = EXCLUDED.{coluna}' for coluna in colunas_campos]
+
+    linha_sql = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    tamanho_lote = connection.ops.bulk_batch_size(fields, linhas)
+
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(linhas), tamanho_lote):
+            lote = linhas[inicio:inicio + tamanho_lote]
+            sql = (
+                f'INSERT INTO {tabela} ({", ".join(colunas)}) '
+                f'VALUES {", ".join([linha_sql] * len(lote))} '
+                f'ON CONFLICT ({", ".join(colunas_chave)}) DO UPDATE SET {", ".join(atualizacoes)}'
+            )
+            params = [
+                field.get_db_prep_save(linha[field.name], connection)
+                for linha in lote
+                for field in fields
+            ]
+            cursor.execute(sql, params)
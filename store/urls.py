@@ -1,14 +1,32 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
-from store.views import ClienteView, ProdutoView, ItemCarrinhoView, CompraView
+from store.views import ClienteView, ProdutoView, ItemCarrinhoView, CompraView, AnaliseView, CampanhaView, MetricaView, SaudeView
+from store.views import async_views
 
 router = DefaultRouter()
 router.register(r'clientes', ClienteView, basename='cliente')
 router.register(r'produtos', ProdutoView, basename='produto')
 router.register(r'itens_carrinho', ItemCarrinhoView, basename='item_carrinho')
 router.register(r'compras', CompraView, basename='compra')
+router.register(r'campanhas', CampanhaView, basename='campanha')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('clientes/<int:pk>/compras/', ClienteView.as_view({'get': 'compras'})),
     path('produtos/aplicar_desconto', ProdutoView.as_view({'post': 'aplicar_desconto'})),
+    path('produtos/busca', ProdutoView.as_view({'get': 'busca'})),
+    path('produtos/importar', ProdutoView.as_view({'post': 'importar'})),
+    path('produtos/cache', ProdutoView.as_view({'get': 'estatisticas_cache'})),
+    path('produtos/aplicar_desconto/<str:task_id>', ProdutoView.as_view({'get': 'status_desconto'})),
+    path('itens_carrinho/lote', ItemCarrinhoView.as_view({'post': 'lote'})),
+    path('analise/top_produtos', AnaliseView.as_view({'get': 'top_produtos'})),
+    path('analise/receita', AnaliseView.as_view({'get': 'receita'})),
+    path('analise/clientes', AnaliseView.as_view({'get': 'clientes'})),
+    path('metricas', MetricaView.as_view({'get': 'list'})),
+    path('saude', SaudeView.as_view({'get': 'list'})),
+    # Leituras assíncronas, para servir com um servidor ASGI
+    path('async/produtos/', async_views.listar_produtos, name='async-produto-list'),
+    path('async/produtos/<str:pk>/', async_views.detalhar_produto, name='async-produto-detail'),
+    path('async/itens_carrinho/', async_views.listar_itens_carrinho, name='async-item_carrinho-list'),
+    path('async/compras/<str:pk>/', async_views.detalhar_compra, name='async-compra-detail'),
 ]
@@ -0,0 +1,39 @@
+from decimal import Decimal
+
+# Limites das colunas: preco é DecimalField(max_digits=10, decimal_places=2) e estoque é IntegerField
+PRECO_MAXIMO = Decimal('99999999.99')
+ESTOQUE_MAXIMO = 2147483647
+
+
+def validar_produto(nome, descricao, preco, estoque):
+    """
+    Validação dos campos de um produto novo
+
+    Usada na criação pela API e na importação em lote. Retorna a mensagem de
+    erro ou None se o produto for válido.
+    """
+
+    # Verifica se os campos existem
+    if not nome or not descricao or not preco or not estoque:
+        return 'Campos obrigatórios faltando'
+
+    # Verifica os campos são válidos
+    if len(nome) < 3 or len(descricao) < 3:
+        return 'O minimo de caracteres para os campos é 3'
+
+    if len(nome) > 100:
+        return 'O máximo de caracteres para o nome é 100'
+
+    # Verifica se o preco é valido: um número finito que cabe na coluna
+    try:
+        preco = Decimal(str(preco))
+        if not preco.is_finite() or preco < 0 or preco > PRECO_MAXIMO or preco != preco.quantize(Decimal('0.01')):
+            return 'Preço inválido'
+    except ArithmeticError:
+        return 'Preço inválido'
+
+    # Verifica se o estoque é valido
+    if estoque < 0 or estoque > ESTOQUE_MAXIMO:
+        return 'Estoque inválido'
+
+    return None
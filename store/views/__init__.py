@@ -1,5 +1,9 @@
+from .analise_views import AnaliseView
+from .campanha_views import CampanhaView
 from .cliente_views import ClienteView
 from .compra_views import CompraView
 from .item_carrinho_views import ItemCarrinhoView
+from .metrica_views import MetricaView
 from .produto_views import ProdutoView
+from .saude_views import SaudeView
 
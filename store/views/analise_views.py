@@ -0,0 +1,136 @@
+from uuid import UUID
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils.dateparse import parse_date
+from rest_framework.response import Response
+from rest_framework.viewsets import ViewSet
+from rest_framework.permissions import AllowAny
+from rest_framework import status
+from store.models import VendaProdutoDia, GastoClienteMes
+
+
+class AnaliseView(ViewSet):
+    """
+    Relatórios de vendas servidos pelas tabelas de rollup
+    """
+
+    permission_classes = [AllowAny]
+
+    def filtro_periodo(self, request, campo):
+        """
+        Monta o filtro de datas a partir de ?inicio= e ?fim= (AAAA-MM-DD, inclusivos)
+        """
+
+        filtro = {}
+        for parametro, lookup in (('inicio', 'gte'), ('fim', 'lte')):
+            valor = request.query_params.get(parametro)
+            if valor:
+                data = parse_date(valor)
+                if not data:
+                    raise ValueError(f'{parametro} deve estar no formato AAAA-MM-DD')
+                if campo == 'mes':
+                    data = data.replace(day=1)
+                filtro[f'{campo}__{lookup}'] = data
+        return filtro
+
+    def limite(self, request):
+        limite = int(request.query_params.get('limite', 10))
+        if limite <= 0:
+            raise ValueError('limite deve ser maior que 0')
+        return min(limite, 100)
+
+    def top_produtos(self, request):
+        """
+        Produtos mais vendidos no período, por receita ou por quantidade
+        """
+
+        try:
+            ordem = request.query_params.get('ordem', 'receita')
+            if ordem not in ('receita', 'quantidade'):
+                raise ValueError("ordem deve ser 'receita' ou 'quantidade'")
+
+            produtos = (
+                VendaProdutoDia.objects
+                .filter(**self.filtro_periodo(request, 'dia'))
+                .values('produto_id', 'produto__nome')
+                .annotate(quantidade=Sum('quantidade'), receita=Sum('receita'))
+                .order_by(f'-{ordem}')[:self.limite(request)]
+            )
+        except ValueError as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = [
+            {
+                'produto': {'id': produto['produto_id'], 'nome': produto['produto__nome']},
+                'quantidade': produto['quantidade'],
+                'receita': produto['receita'],
+            }
+            for produto in produtos
+        ]
+        return Response(data, status=status.HTTP_200_OK)
+
+    def receita(self, request):
+        """
+        Receita ao longo do tempo, por dia ou por mês, opcionalmente de um produto
+        """
+
+        try:
+            agrupamento = request.query_params.get('agrupamento', 'dia')
+            if agrupamento not in ('dia', 'mes'):
+                raise ValueError("agrupamento deve ser 'dia' ou 'mes'")
+
+            vendas = VendaProdutoDia.objects.filter(**self.filtro_periodo(request, 'dia'))
+            produto_id = request.query_params.get('produto_id')
+            if produto_id:
+                try:
+                    produto_id = UUID(produto_id)
+                except ValueError:
+                    raise ValueError('produto_id deve ser um UUID')
+                vendas = vendas.filter(produto_id=produto_id)
+
+            if agrupamento == 'mes':
+                vendas = vendas.annotate(periodo=TruncMonth('dia'))
+            else:
+                vendas = vendas.annotate(periodo=F('dia'))
+
+            vendas = (
+                vendas.values('periodo')
+                .annotate(quantidade=Sum('quantidade'), receita=Sum('receita'))
+                .order_by('periodo')
+            )
+            data = list(vendas)
+        except ValueError as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(data, status=status.HTTP_200_OK)
+
+    def clientes(self, request):
+        """
+        Clientes que mais gastaram no período ou, com ?cliente_id=, o gasto mês a mês do cliente
+        """
+
+        try:
+            gastos = GastoClienteMes.objects.filter(**self.filtro_periodo(request, 'mes'))
+            cliente_id = request.query_params.get('cliente_id')
+
+            if cliente_id:
+                data = list(gastos.filter(cliente_id=int(cliente_id)).values('mes', 'compras', 'valor').order_by('mes'))
+                return Response(data, status=status.HTTP_200_OK)
+
+            clientes = (
+                gastos.values('cliente_id', 'cliente__nome', 'cliente__sobrenome')
+                .annotate(compras=Sum('compras'), valor=Sum('valor'))
+                .order_by('-valor')[:self.limite(request)]
+            )
+        except ValueError as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = [
+            {
+                'cliente': {'id': cliente['cliente_id'], 'nome': f"{cliente['cliente__nome']} {cliente['cliente__sobrenome']}"},
+                'compras': cliente['compras'],
+                'valor': cliente['valor'],
+            }
+            for cliente in clientes
+        ]
+        return Response(data, status=status.HTTP_200_OK)
@@ -0,0 +1,41 @@
+from django.http import JsonResponse
+from store.assincrono import no_banco
+from store.streaming import SO_WSGI
+from store.views.compra_views import CompraView
+from store.views.item_carrinho_views import ItemCarrinhoView
+from store.views.produto_views import ProdutoView
+
+
+def _assincrona(view):
+    """
+    Versão assíncrona de uma ação de ViewSet
+
+    A view inteira (cache, banco e renderização) roda no pool do banco e o
+    event loop fica livre para atender outras requisições enquanto isso. As
+    respostas são as mesmas das rotas síncronas, inclusive ETag e 304.
+    """
+
+    def executar(request, kwargs):
+        response = view(request, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    async def view_assincrona(request, **kwargs):
+        return await no_banco(executar, request, kwargs)
+
+    return view_assincrona
+
+
+_listar_produtos = _assincrona(ProdutoView.as_view({'get': 'list'}))
+
+
+async def listar_produtos(request):
+    if request.GET.get('stream') == '1':
+        return JsonResponse({'error': 'Dados inválidos', 'message': SO_WSGI}, status=400)
+    return await _listar_produtos(request)
+
+
+detalhar_produto = _assincrona(ProdutoView.as_view({'get': 'retrieve'}))
+listar_itens_carrinho = _assincrona(ItemCarrinhoView.as_view({'get': 'list'}))
+detalhar_compra = _assincrona(CompraView.as_view({'get': 'retrieve'}))
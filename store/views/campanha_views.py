@@ -0,0 +1,116 @@
+from uuid import UUID
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.response import Response
+from rest_framework.viewsets import ViewSet
+from rest_framework.permissions import AllowAny
+from rest_framework import status
+from store import campanhas
+from store.campos import CamposInvalidos, ler_campos, podar, quer
+from store.models import CampanhaDesconto, Produto
+
+
+ESQUEMA_CAMPANHA = dict.fromkeys(('id', 'nome', 'desconto', 'inicio', 'fim', 'ativa', 'produtos'))
+
+
+def serializar_campanha(campanha, produtos):
+    return {
+        'id': campanha.id,
+        'nome': campanha.nome,
+        'desconto': campanha.desconto,
+        'inicio': campanha.inicio,
+        'fim': campanha.fim,
+        'ativa': campanha.ativa,
+        'produtos': produtos,
+    }
+
+
+class CampanhaView(ViewSet):
+    """
+    Campanhas de desconto com início e fim agendados
+    """
+
+    permission_classes = [AllowAny]
+
+    def horario(self, request, campo):
+        valor = request.data.get(campo)
+        horario = parse_datetime(valor) if isinstance(valor, str) else None
+        if not horario:
+            raise ValueError(f'{campo} deve ser uma data e hora no formato ISO 8601')
+        if timezone.is_naive(horario):
+            horario = timezone.make_aware(horario)
+        return horario
+
+    def list(self, request):
+        """
+        Lista as campanhas com a quantidade de produtos de cada uma
+        """
+
+        try:
+            campos = ler_campos(request, ESQUEMA_CAMPANHA)
+        except CamposInvalidos as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        consulta = CampanhaDesconto.objects.order_by('-inicio', 'id')
+        if quer(campos, 'produtos'):
+            consulta = consulta.annotate(total_produtos=Count('produtos'))
+
+        data = []
+        for campanha in consulta:
+            data.append(podar(serializar_campanha(campanha, getattr(campanha, 'total_produtos', None)), campos))
+
+        return Response(data, status=status.HTTP_200_OK)
+
+    def create(self, request):
+        """
+        Cria uma campanha e agenda a ativação e a expiração no beat
+        """
+
+        try:
+            nome = (request.data.get('nome') or '').strip()
+            desconto = request.data.get('desconto')
+            produto_ids = request.data.get('produtos')
+
+            if len(nome) < 3:
+                raise ValueError('O minimo de caracteres para o nome é 3')
+            if not isinstance(desconto, int) or isinstance(desconto, bool) or desconto <= 0 or desconto > 100:
+                raise ValueError('desconto deve ser um inteiro entre 1 e 100')
+            inicio = self.horario(request, 'inicio')
+            fim = self.horario(request, 'fim')
+            if fim <= inicio:
+                raise ValueError('fim deve ser depois do inicio')
+            if not isinstance(produto_ids, list) or not produto_ids:
+                raise ValueError('Informe a lista de produtos')
+            produto_ids = {UUID(str(produto_id)) for produto_id in produto_ids}
+        except (ValueError, TypeError) as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        encontrados = set(Produto.objects.filter(pk__in=produto_ids).values_list('id', flat=True))
+        if len(encontrados) != len(produto_ids):
+            return Response({'error': 'Produto não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+        with transaction.atomic():
+            campanha = CampanhaDesconto.objects.create(nome=nome, desconto=desconto, inicio=inicio, fim=fim)
+            campanha.produtos.set(encontrados)
+            campanhas.agendar(campanha)
+
+        # Uma campanha que já começou vale na hora
+        campanhas.atualizar_campanhas()
+        campanha.refresh_from_db()
+
+        return Response(serializar_campanha(campanha, len(encontrados)), status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, pk=None):
+        """
+        Encerra a campanha: o desconto sai dos produtos e o agendamento é removido
+        """
+
+        try:
+            campanha = CampanhaDesconto.objects.get(pk=pk)
+        except (ValueError, CampanhaDesconto.DoesNotExist):
+            return Response({'error': 'Campanha não encontrada'}, status=status.HTTP_404_NOT_FOUND)
+
+        campanhas.cancelar(campanha)
+        return Response({'message': 'Campanha encerrada'}, status=status.HTTP_200_OK)
@@ -1,11 +1,19 @@
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 from rest_framework.permissions import AllowAny
 from rest_framework import status
-from store.models import Cliente
+from store.models import Cliente, Compra
+from store.paginacao import PaginacaoPorCursor, CursorInvalido
+from store.campos import CamposInvalidos, ler_campos, podar, selecionados
+from store.serializers import CAMPOS_CLIENTE, ESQUEMA_CLIENTE, ESQUEMA_COMPRA, compras_com_itens, serializar_compras
 
 class ClienteView(ViewSet):
     permission_classes = [AllowAny]
+    paginacao = PaginacaoPorCursor(('id',))
+    paginacao_compras = PaginacaoPorCursor(('-data_compra', '-id'))
 
     def retrieve(self, request, pk=None):
         """
@@ -13,17 +21,12 @@ class ClienteView(ViewSet):
         """
 
         try:
-            cliente = Cliente.objects.get(pk=pk)
-            data = {
-                'id': cliente.id,
-                'nome': cliente.nome,
-                'sobrenome': cliente.sobrenome,
-                "cpf_cnpj": cliente.cpf_cnpj,
-                'email': cliente.email,
-                'telefone': cliente.telefone,
-                'endereco': cliente.endereco,
-            }
+            campos = ler_campos(request, ESQUEMA_CLIENTE)
+        except CamposInvalidos as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            data = Cliente.objects.values(*selecionados(campos, CAMPOS_CLIENTE)).get(pk=pk)
             return Response(data, status=status.HTTP_200_OK)
         
         except Cliente.DoesNotExist:
@@ -31,23 +34,19 @@ class ClienteView(ViewSet):
         
     def list(self, request):
         """
-        Lista todos os clientes
+        Lista os clientes paginados por cursor
         """
 
-        clientes = Cliente.objects.all()
-        data = []
-        for cliente in clientes:
-            data.append({
-                'id': cliente.id,
-                'nome': cliente.nome,
-                'sobrenome': cliente.sobrenome,
-                "cpf_cnpj": cliente.cpf_cnpj,
-                'email': cliente.email,
-                'telefone': cliente.telefone,
-                'endereco': cliente.endereco,
-            })
-
-        return Response(data, status=status.HTTP_200_OK)
+        try:
+            campos = ler_campos(request, ESQUEMA_CLIENTE)
+            # Os dicionários do values() já são as linhas da resposta; o id vai
+            # junto sempre por causa do cursor
+            colunas = selecionados(campos, CAMPOS_CLIENTE)
+            clientes, paginacao = self.paginacao.paginar(request, Cliente.objects.values('id', *colunas))
+        except (CursorInvalido, CamposInvalidos) as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'resultados': podar(clientes, campos), **paginacao}, status=status.HTTP_200_OK)
     
     def create(self, request):
         """
@@ -185,4 +184,46 @@ class ClienteView(ViewSet):
         
         except Cliente.DoesNotExist:
             return Response({'error': 'Cliente não encontrado'}, status=status.HTTP_404_NOT_FOUND)
-    
+
+    def filtro_periodo(self, request):
+        """
+        Monta o filtro de data_compra a partir de ?inicio= e ?fim= (AAAA-MM-DD, inclusivos)
+        """
+
+        filtro = {}
+        for parametro, lookup, dias in (('inicio', 'gte', 0), ('fim', 'lt', 1)):
+            valor = request.query_params.get(parametro)
+            if valor:
+                data = parse_date(valor)
+                if not data:
+                    raise ValueError(f'{parametro} deve estar no formato AAAA-MM-DD')
+                # O fim é inclusivo: vai até a meia-noite do dia seguinte. No início
+                # do horário de verão a meia-noite não existe; is_dst=False a leva
+                # para o instante em que o dia começa
+                meia_noite = datetime.combine(data + timedelta(days=dias), time.min)
+                filtro[f'data_compra__{lookup}'] = timezone.make_aware(meia_noite, is_dst=False)
+        return filtro
+
+    def compras(self, request, pk=None):
+        """
+        Histórico de compras de um cliente, das mais recentes para as mais antigas
+
+        A busca usa o índice (cliente, data_compra, id), então o custo depende só
+        do tamanho da página e não do total de compras da loja.
+        """
+
+        try:
+            filtro = self.filtro_periodo(request)
+            campos = ler_campos(request, ESQUEMA_COMPRA)
+        except ValueError as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not Cliente.objects.filter(pk=pk).exists():
+            return Response({'error': 'Cliente não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            compras, paginacao = self.paginacao_compras.paginar(request, compras_com_itens(Compra.objects.filter(cliente_id=pk, **filtro), campos))
+        except CursorInvalido as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'resultados': serializar_compras(compras, campos), **paginacao}, status=status.HTTP_200_OK)
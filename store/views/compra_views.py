@@ -1,11 +1,24 @@
+from urllib.parse import urlencode
+from uuid import UUID
+from django.urls import reverse
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 from rest_framework.permissions import AllowAny
 from rest_framework import status
-from store.models import Compra, Cliente, Produto, ItemCompra, ItemCarrinho
+from store import cache as cache_versoes
+from store.checkout import finalizar_compra, CarrinhoVazio, QuantidadeInvalida, EstoqueInsuficiente
+from store.checkout_em_lote import aceitar_compra
+from store.campos import CamposInvalidos, ler_campos
+from store.condicional import Condicional
+from store.idempotencia import idempotente
+from store.models import Compra, Cliente
+from store.paginacao import PaginacaoPorCursor, CursorInvalido
+from store.serializers import ESQUEMA_COMPRA, compras_com_itens, serializar_compra, serializar_compras
+from store.streaming import SO_WSGI, em_asgi, resposta_em_streaming, compras_em_lotes
 
 class CompraView(ViewSet):
     permission_classes = [AllowAny]
+    paginacao = PaginacaoPorCursor(('data_compra', 'id'))
 
     def retrieve(self, request, pk=None):
         """
@@ -13,71 +26,68 @@ class CompraView(ViewSet):
         """
 
         try:
+            campos = ler_campos(request, ESQUEMA_COMPRA)
+        except CamposInvalidos as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            compra = Compra.objects.get(pk=pk)
+        try:
+            pk = str(UUID(pk))
+
+            # Se o cliente já tem essa versão, responde 304 sem ler a compra
+            condicional = Condicional('c', cache_versoes.versoes_compra(pk), request.query_params.get('fields'))
+            nao_modificado = condicional.nao_modificado(request)
+            if nao_modificado:
+                return nao_modificado
+
+            compra = compras_com_itens(Compra.objects.all(), campos).get(pk=pk)
+            return condicional.aplicar(Response(serializar_compra(compra, campos), status=status.HTTP_200_OK))
+
+        except (ValueError, Compra.DoesNotExist):
+            return Response({'error': 'Compra não encontrada'}, status=status.HTTP_404_NOT_FOUND)
 
-            if not compra:
-                return Response({'error': 'Compra não encontrada'}, status=status.HTTP_404_NOT_FOUND)
-            
-            items = ItemCompra.objects.filter(compra=compra)
-
-            data = {
-                'id': compra.id,
-                'cliente_cpf_cnpj': compra.cliente.cpf_cnpj,
-                'itens': [],
-                'valor_total': compra.valor_total,
-            }
-
-            for item in items:
-                data['itens'].append({
-                    'produto': {
-                        'id': item.produto.id,
-                        'nome': item.produto.nome,
-                        'preco': item.preco_unidade,
-                    },
-                    'desconto_aplicado': item.desconto_aplicado,
-                    'quantidade': item.quantidade,
-                    'subtotal': item.subtotal(),
-                })
-
-            return Response(data, status=status.HTTP_200_OK)
-        
         except Exception as e:
             return Response({'error': 'Erro interno', 'message': f'{e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
     def list(self, request):
         """
-        Lista todas as compras
+        Lista as compras paginadas por cursor
+
+        ?fields= escolhe os campos, inclusive dos itens (itens.quantidade,
+        itens.produto.nome). Com ?stream=1 retorna todas as compras em
+        streaming, sem paginação
         """
 
-        compras = Compra.objects.all()
-        data = []
-        for compra in compras:
-            items = ItemCompra.objects.filter(compra=compra)
-            itens = []
-            for item in items:
-                itens.append({
-                    'produto': {
-                        'id': item.produto.id,
-                        'nome': item.produto.nome,
-                        'preco': item.preco_unidade,
-                    },
-                    'desconto_aplicado': item.desconto_aplicado,
-                    'quantidade': item.quantidade,
-                })
-
-            data.append({
-                'id': compra.id,
-                'cliente_cpf_cnpj': compra.cliente.cpf_cnpj,
-                'itens': itens,
-                'valor_total': compra.valor_total,
-            })
-
-        return Response(data, status=status.HTTP_200_OK)
+        try:
+            campos = ler_campos(request, ESQUEMA_COMPRA)
+        except CamposInvalidos as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.query_params.get('stream') == '1':
+            if em_asgi(request):
+                return Response({'error': 'Dados inválidos', 'message': SO_WSGI}, status=status.HTTP_400_BAD_REQUEST)
+            return resposta_em_streaming(compras_em_lotes(Compra.objects.all(), campos))
+
+        parametros = urlencode(sorted(request.query_params.lists()), doseq=True)
+        condicional = Condicional('lc', cache_versoes.versoes_compras(), cache_versoes.resumo_parametros(parametros))
+        nao_modificado = condicional.nao_modificado(request)
+        if nao_modificado:
+            return nao_modificado
+
+        try:
+            compras, paginacao = self.paginacao.paginar(request, compras_com_itens(Compra.objects.all(), campos))
+        except CursorInvalido as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return condicional.aplicar(Response({'resultados': serializar_compras(compras, campos), **paginacao}, status=status.HTTP_200_OK))
     
+    @idempotente
     def create(self, request):
         """
         Cria uma compra
+
+        Com "assincrono": true a compra é aceita na hora (202) e o estoque é
+        baixado por um worker; o status fica em status_url. Aceita o header
+        Idempotency-Key para repetir a resposta em vez de comprar de novo.
         """
 
         try:
@@ -87,58 +97,37 @@ class CompraView(ViewSet):
                 return Response({'error': 'Dados inválidos', 'message': 'Informe o ID do Cliente'}, status=status.HTTP_400_BAD_REQUEST)
 
             cliente = Cliente.objects.get(pk=cliente_id)
-            if not cliente:
-                return Response({'error': 'Cliente não encontrado'}, status=status.HTTP_404_NOT_FOUND)
             
             # Verifica se o cliente está ativo
             if not cliente.ativo:
                 return Response({'error': 'Cliente inativo'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            itens_carrinho = ItemCarrinho.objects.filter(cliente=cliente)
 
-            if not itens_carrinho:
-                return Response({'error': 'Carrinho vazio'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Verifica se a quantidade de produtos é válida
-            for item in itens_carrinho:
-                if item.quantidade <= 0:
-                    return Response({'error': 'Dados inválidos', 'message': 'A quantidade deve ser maior que 0'}, status=status.HTTP_400_BAD_REQUEST)
-                if item.quantidade > item.produto.estoque:
-                    return Response({'error': 'Dados inválidos', 'message': 'Quantidade maior que o estoque'}, status=status.HTTP_400_BAD_REQUEST)
-
-            compra = Compra.objects.create(cliente=cliente)
-
-            for item in itens_carrinho:
-                compra.add_item(item.produto, item.quantidade)
-
-            # limpa o carrinho
-            cliente.clear_cart()
-
-            data = {
-                'id': compra.id,
-                'cliente_cpf_cnpj': compra.cliente.cpf_cnpj,
-                'itens': [],
-                'valor_total': compra.valor_total,
-            }
-
-            items = ItemCompra.objects.filter(compra=compra)
-            for item in items:
-                data['itens'].append({
-                    'produto': {
-                        'id': item.produto.id,
-                        'nome': item.produto.nome,
-                        'preco': item.preco_unidade,
-                    },
-                    'desconto_aplicado': item.desconto_aplicado,
-                    'quantidade': item.quantidade,
-                    'subtotal': item.subtotal(),
-                })
-
-
-            return Response(data, status=status.HTTP_201_CREATED)
+            if request.data.get('assincrono') is True:
+                compra = aceitar_compra(cliente)
+                url = request.build_absolute_uri(reverse('compra-detail', args=[compra.pk]))
+                response = Response({'id': compra.pk, 'status': compra.status, 'status_url': url}, status=status.HTTP_202_ACCEPTED)
+                response['Location'] = url
+                return response
+
+            compra = finalizar_compra(cliente)
+            compra = compras_com_itens(Compra.objects.all()).get(pk=compra.pk)
+
+            return Response(serializar_compra(compra), status=status.HTTP_201_CREATED)
         
         except KeyError:
             return Response({'error': 'Dados inválidos'}, status=status.HTTP_400_BAD_REQUEST)
+
+        except Cliente.DoesNotExist:
+            return Response({'error': 'Cliente não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+        except CarrinhoVazio:
+            return Response({'error': 'Carrinho vazio'}, status=status.HTTP_400_BAD_REQUEST)
+
+        except QuantidadeInvalida:
+            return Response({'error': 'Dados inválidos', 'message': 'A quantidade deve ser maior que 0'}, status=status.HTTP_400_BAD_REQUEST)
+
+        except EstoqueInsuficiente as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e), 'produtos': e.produtos}, status=status.HTTP_400_BAD_REQUEST)
         
         except Exception as e:
             return Response({'error': 'Erro interno'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
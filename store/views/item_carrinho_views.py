@@ -2,7 +2,12 @@ from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 from rest_framework.permissions import AllowAny
 from rest_framework import status
+from store.campos import CamposInvalidos, ler_campos
+from store.carrinho import atualizar_carrinho
+from store.idempotencia import idempotente
 from store.models import ItemCarrinho, Cliente, Produto
+from store.reservas import remover_itens, reservar
+from store.serializers import ESQUEMA_ITEM_CARRINHO, itens_carrinho, serializar_item_carrinho
 
 class ItemCarrinhoView(ViewSet):
     permission_classes = [AllowAny]
@@ -13,19 +18,13 @@ class ItemCarrinhoView(ViewSet):
         """
 
         try:
-            item = ItemCarrinho.objects.get(pk=pk)
-            data = {
-                'id': item.id,
-                'produto': {
-                    'id': item.produto.id,
-                    'nome': item.produto.nome,
-                    'preco': item.produto.preco,
-                    'desconto': item.produto.desconto,
-                },
-                'quantidade': item.quantidade,
-            }
+            campos = ler_campos(request, ESQUEMA_ITEM_CARRINHO)
+        except CamposInvalidos as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response(data, status=status.HTTP_200_OK)
+        try:
+            item = itens_carrinho(ItemCarrinho.objects.all(), campos).get(pk=pk)
+            return Response(serializar_item_carrinho(item, campos), status=status.HTTP_200_OK)
         
         except ItemCarrinho.DoesNotExist:
             return Response({'error': 'Item não encontrado'}, status=status.HTTP_404_NOT_FOUND)
@@ -44,27 +43,20 @@ class ItemCarrinhoView(ViewSet):
             if not cliente:
                 return Response({'error': 'Cliente não encontrado'}, status=status.HTTP_404_NOT_FOUND)
 
-            itens = ItemCarrinho.objects.filter(cliente=cliente)  
-
-            data = []
+            try:
+                campos = ler_campos(request, ESQUEMA_ITEM_CARRINHO)
+            except CamposInvalidos as e:
+                return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            for item in itens:
-                data.append({
-                    'id': item.id,
-                    'produto': {
-                        'id': item.produto.id,
-                        'nome': item.produto.nome,
-                        'preco': item.produto.preco,
-                        'desconto': item.produto.desconto,
-                    },
-                    'quantidade': item.quantidade,
-                })
+            itens = itens_carrinho(ItemCarrinho.objects.filter(cliente=cliente), campos)
+            data = [serializar_item_carrinho(item, campos) for item in itens]
 
             return Response(data, status=status.HTTP_200_OK)
         
         except Cliente.DoesNotExist:
             return Response({'error': 'Cliente não encontrado'}, status=status.HTTP_404_NOT_FOUND)
     
+    @idempotente
     def create(self, request):
         """
         Adiciona um item em um carrinho
@@ -91,10 +83,10 @@ class ItemCarrinhoView(ViewSet):
 
             if not produto:
                 return Response({'error': 'Produto não encontrado'}, status=status.HTTP_404_NOT_FOUND)
-            if quantidade > produto.estoque:
+
+            # Reserva a quantidade no estoque pelo tempo de RESERVA_TTL_SEGUNDOS
+            if reservar(cliente, {produto.pk: quantidade}, faixas={produto.pk: produto.faixas_estoque})[produto.pk] is None:
                 return Response({'error': 'Estoque insuficiente'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            cliente.update_cart(produto, quantidade)
 
             return Response({'message': 'Item adicionado ao carrinho'}, status=status.HTTP_200_OK)
         
@@ -104,6 +96,33 @@ class ItemCarrinhoView(ViewSet):
         except Cliente.DoesNotExist:
             return Response({'error': 'Cliente não encontrado'}, status=status.HTTP_404_NOT_FOUND)
         
+    @idempotente
+    def lote(self, request):
+        """
+        Atualiza vários itens do carrinho de um cliente de uma vez
+        """
+
+        try:
+            cliente_id = request.data['cliente_id']
+            itens = request.data['itens']
+
+            if not cliente_id or not isinstance(itens, list) or not itens:
+                return Response({'error': 'Dados inválidos', 'message': 'Informe o cliente_id e a lista de itens'}, status=status.HTTP_400_BAD_REQUEST)
+
+            cliente = Cliente.objects.get(pk=cliente_id)
+            if not cliente.ativo:
+                return Response({'error': 'Cliente inativo'}, status=status.HTTP_400_BAD_REQUEST)
+
+            resultados = atualizar_carrinho(cliente, itens)
+
+            return Response({'itens': resultados}, status=status.HTTP_200_OK)
+
+        except KeyError:
+            return Response({'error': 'Dados inválidos'}, status=status.HTTP_400_BAD_REQUEST)
+
+        except Cliente.DoesNotExist:
+            return Response({'error': 'Cliente não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        
     def update(self, request, pk=None): 
         """
         Atualiza a quantidade de um item em um carrinho
@@ -145,7 +164,7 @@ class ItemCarrinhoView(ViewSet):
 
         try:
             item = ItemCarrinho.objects.get(pk=pk)
-            item.delete()
+            remover_itens(ItemCarrinho.objects.filter(pk=item.pk))
 
             return Response({'message': 'Item removido do carrinho'}, status=status.HTTP_200_OK)
         
@@ -0,0 +1,15 @@
+from django.http import HttpResponse
+from rest_framework.viewsets import ViewSet
+from rest_framework.permissions import AllowAny
+from store import metricas
+
+
+class MetricaView(ViewSet):
+    """
+    Métricas de desempenho no formato texto do Prometheus
+    """
+
+    permission_classes = [AllowAny]
+
+    def list(self, request):
+        return HttpResponse(metricas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
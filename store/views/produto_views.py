@@ -1,53 +1,143 @@
-from decimal import Decimal
+import io
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+from uuid import UUID
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 from rest_framework.permissions import AllowAny
 from rest_framework import status
+from store import cache as cache_produtos
+from store.busca import buscar_produtos
+from store.campos import CamposInvalidos, ler_campos, podar
+from store.condicional import Condicional
+from store.estoque import com_disponivel, definir_estoque, rebalancear, totais
+from store.importacao import importar_produtos
 from store.models import Produto
+from store.paginacao import PaginacaoPorCursor, CursorInvalido
+from store.serializers import ESQUEMA_PRODUTO, projetar_produtos, serializar_produtos
+from store.streaming import SO_WSGI, em_asgi, resposta_em_streaming, produtos_em_lotes
 from store.tasks import atualizar_desconto
+from store.validacao import validar_produto
 
 class ProdutoView(ViewSet):
     permission_classes = [AllowAny]
+    # ?ordering= -> paginação; cada ordenação tem um índice com id no fim
+    ordenacoes = {
+        'nome': PaginacaoPorCursor(('nome', 'id')),
+        '-nome': PaginacaoPorCursor(('-nome', '-id')),
+        'preco': PaginacaoPorCursor(('preco_final', 'id')),
+        '-preco': PaginacaoPorCursor(('-preco_final', '-id')),
+    }
+
+    def carregar_produto(self, pk):
+        linha = projetar_produtos(Produto.objects.filter(pk=pk)).first()
+        if linha is None:
+            raise Produto.DoesNotExist()
+        return serializar_produtos([linha])[0]
+
+    def filtrar(self, request):
+        """
+        Aplica ?min_preco=, ?max_preco= (preço com desconto) e ?em_estoque=
+        """
+
+        produtos = Produto.objects.all()
+        for parametro, lookup in (('min_preco', 'gte'), ('max_preco', 'lte')):
+            valor = request.query_params.get(parametro)
+            if valor is None:
+                continue
+            try:
+                valor = Decimal(valor)
+            except InvalidOperation:
+                raise CursorInvalido(f'{parametro} deve ser um número')
+            if not valor.is_finite() or valor < 0:
+                raise CursorInvalido(f'{parametro} deve ser um número maior ou igual a 0')
+            produtos = produtos.filter(**{f'preco_final__{lookup}': valor})
+
+        em_estoque = request.query_params.get('em_estoque')
+        if em_estoque not in (None, '0', '1', 'true', 'false'):
+            raise CursorInvalido("em_estoque deve ser 'true' ou 'false'")
+        if em_estoque in ('1', 'true'):
+            produtos = com_disponivel(produtos)
+
+        return produtos
+
+    def carregar_lista(self, request):
+        ordering = request.query_params.get('ordering', 'nome')
+        if ordering not in self.ordenacoes:
+            raise CursorInvalido(f"ordering deve ser um de: {', '.join(self.ordenacoes)}")
+
+        campos = ler_campos(request, ESQUEMA_PRODUTO)
+        paginacao = self.ordenacoes[ordering]
+        extras = [campo.lstrip('-') for campo in paginacao.ordenacao]
+        linhas, meta = paginacao.paginar(request, projetar_produtos(self.filtrar(request), campos, extras))
+        return {'resultados': serializar_produtos(linhas, campos), **meta}
 
     def retrieve(self, request, pk=None):
         """
         Retorna um produto
+
+        O cache guarda o produto inteiro; ?fields= só recorta a resposta
         """
 
         try:
-            produto = Produto.objects.get(pk=pk)
-            data = {
-                'id': produto.id,
-                'nome': produto.nome,
-                'descricao': produto.descricao,
-                'preco': produto.preco,
-                'estoque': produto.estoque,
-                'desconto': produto.desconto,
-            }
+            campos = ler_campos(request, ESQUEMA_PRODUTO)
+        except CamposInvalidos as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response(data, status=status.HTTP_200_OK)
+        try:
+            pk = str(UUID(pk))
+            versoes = cache_produtos.versoes_produto(pk)
+
+            # Se o cliente já tem essa versão, responde 304 sem ler o produto
+            condicional = Condicional('p', versoes, request.query_params.get('fields'))
+            nao_modificado = condicional.nao_modificado(request)
+            if nao_modificado:
+                return nao_modificado
+
+            data, acerto = cache_produtos.ler_produto(pk, versoes, lambda: self.carregar_produto(pk))
+
+            response = Response(podar(data, campos), status=status.HTTP_200_OK)
+            response['X-Cache'] = 'HIT' if acerto else 'MISS'
+            return condicional.aplicar(response)
         
-        except Produto.DoesNotExist:
+        except (ValueError, Produto.DoesNotExist):
             return Response({'error': 'Produto não encontrado'}, status=status.HTTP_404_NOT_FOUND)
         
     def list(self, request):
         """
-        Lista todos os produtos
+        Lista os produtos paginados por cursor
+
+        Aceita os filtros min_preco, max_preco e em_estoque e a ordenação
+        ?ordering= (nome, -nome, preco, -preco). ?fields= limita as colunas
+        lidas e devolvidas. Com ?stream=1 retorna todos os produtos filtrados em
+        streaming, sem paginação
         """
 
-        produtos = Produto.objects.all()
-        data = []
-        for produto in produtos:
-            data.append({
-                'id': produto.id,
-                'nome': produto.nome,
-                'descricao': produto.descricao,
-                'preco': produto.preco,
-                'estoque': produto.estoque,
-                'desconto': produto.desconto,
-            })
+        if request.query_params.get('stream') == '1':
+            if em_asgi(request):
+                return Response({'error': 'Dados inválidos', 'message': SO_WSGI}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                produtos = self.filtrar(request)
+                campos = ler_campos(request, ESQUEMA_PRODUTO)
+            except (CursorInvalido, CamposInvalidos) as e:
+                return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return resposta_em_streaming(produtos_em_lotes(produtos, campos))
 
-        return Response(data, status=status.HTTP_200_OK)
+        parametros = urlencode(sorted(request.query_params.lists()), doseq=True)
+        versao = cache_produtos.versao_catalogo()
+        condicional = Condicional('lp', [versao], cache_produtos.resumo_parametros(parametros))
+        nao_modificado = condicional.nao_modificado(request)
+        if nao_modificado:
+            return nao_modificado
+
+        try:
+            data, acerto = cache_produtos.ler_lista_produtos(parametros, versao, lambda: self.carregar_lista(request))
+        except (CursorInvalido, CamposInvalidos) as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = Response(data, status=status.HTTP_200_OK)
+        response['X-Cache'] = 'HIT' if acerto else 'MISS'
+        return condicional.aplicar(response)
         
     def create(self, request):
         """
@@ -60,35 +150,91 @@ class ProdutoView(ViewSet):
             preco = request.data['preco']
             estoque = request.data['estoque']
 
-            # Verifica se os campos existem
-            if not nome or not descricao or not preco or not estoque:
-                return Response({'error': 'Dados inválidos'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Verifica os campos são válidos
-            if len(nome) < 3 or len(descricao) < 3:
-                return Response({'error': 'Dados inválidos', 'message': 'O minimo de caracteres para os campos é 3'}, status=status.HTTP_400_BAD_REQUEST)
+            sku = request.data.get('sku') or None
 
-            # Verifica se o preco é valido
-            if preco < 0:
-                return Response({'error': 'Dados inválidos', 'message': 'Preço inválido'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Verifica se o estoque é valido
-            if estoque < 0:
-                return Response({'error': 'Dados inválidos', 'message': 'Estoque inválido'}, status=status.HTTP_400_BAD_REQUEST)
+            erro = validar_produto(nome, descricao, preco, estoque)
+            if erro:
+                return Response({'error': 'Dados inválidos', 'message': erro}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Verifica se o sku já foi cadastrado
+            if sku and Produto.objects.filter(sku=sku).exists():
+                return Response({'error': 'Dados inválidos', 'message': 'SKU já cadastrado'}, status=status.HTTP_400_BAD_REQUEST)
             
-            produto = Produto.objects.create(nome=nome, descricao=descricao, preco=preco, estoque=estoque)
+            produto = Produto.objects.create(sku=sku, nome=nome, descricao=descricao, preco=preco, estoque=estoque)
             data = {
                 'id': produto.id,
+                'sku': produto.sku,
                 'nome': produto.nome,
                 'descricao': produto.descricao,
                 'preco': produto.preco,
                 'estoque': produto.estoque,
+                'disponivel': produto.estoque,
+                'preco_final': produto.preco_final,
             }
 
             return Response(data, status=status.HTTP_201_CREATED)
         except Exception as e:
             return Response({'error': 'Erro ao criar produto', 'message': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
+    def busca(self, request):
+        """
+        Busca produtos por nome e descrição (?q=), ordenados por relevância
+        """
+
+        texto = request.query_params.get('q', '').strip()
+        if not texto:
+            return Response({'error': 'Dados inválidos', 'message': 'Informe o texto da busca em q'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limite = int(request.query_params.get('limite', 20))
+        except ValueError:
+            return Response({'error': 'Dados inválidos', 'message': 'limite deve ser um número inteiro'}, status=status.HTTP_400_BAD_REQUEST)
+        if limite <= 0:
+            return Response({'error': 'Dados inválidos', 'message': 'limite deve ser maior que 0'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            campos = ler_campos(request, ESQUEMA_PRODUTO)
+        except CamposInvalidos as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        produtos = buscar_produtos(texto, min(limite, 100))
+        estoques = totais(produtos)
+        data = []
+        for produto in produtos:
+            estoque, reservado = estoques[produto.id]
+            data.append({
+                'id': produto.id,
+                'sku': produto.sku,
+                'nome': produto.nome,
+                'descricao': produto.descricao,
+                'preco': produto.preco,
+                'estoque': estoque,
+                'disponivel': estoque - reservado,
+                'desconto': produto.desconto,
+                'preco_final': produto.preco_final,
+            })
+
+        return Response({'resultados': podar(data, campos)}, status=status.HTTP_200_OK)
+
+    def importar(self, request):
+        """
+        Importa produtos de um arquivo CSV ou JSONL enviado no campo 'arquivo'
+        """
+
+        arquivo = request.FILES.get('arquivo')
+        if not arquivo:
+            return Response({'error': 'Dados inválidos', 'message': 'Envie o arquivo no campo arquivo'}, status=status.HTTP_400_BAD_REQUEST)
+
+        formato = request.data.get('formato') or arquivo.name.rsplit('.', 1)[-1].lower()
+
+        try:
+            texto = io.TextIOWrapper(arquivo.file, encoding='utf-8', newline='')
+            relatorio = importar_produtos(texto, formato)
+        except (ValueError, UnicodeDecodeError) as e:
+            return Response({'error': 'Dados inválidos', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(relatorio, status=status.HTTP_200_OK)
+        
     def update(self, request, pk=None):
         """
         Atualiza um produto
@@ -102,40 +248,64 @@ class ProdutoView(ViewSet):
             preco = request.data.get('preco')
             estoque = request.data.get('estoque')
             desconto = request.data.get('desconto')
+            faixas_estoque = request.data.get('faixas_estoque')
 
             # Verifica se os campos existem
             if nome:
                 if len(nome) < 3:
                     return Response({'error': 'Dados inválidos', 'message': 'O minimo de caracteres para os campos é 3'}, status=status.HTTP_400_BAD_REQUEST)
                 produto.nome = nome
+                campo = 'nome'
             elif descricao:
                 if len(descricao) < 3:
                     return Response({'error': 'Dados inválidos', 'message': 'O minimo de caracteres para os campos é 3'}, status=status.HTTP_400_BAD_REQUEST)
                 produto.descricao = descricao
+                campo = 'descricao'
             elif preco:
                 if preco < 0:
                     return Response({'error': 'Dados inválidos', 'message': 'Preço inválido'}, status=status.HTTP_400_BAD_REQUEST)
                 produto.preco = preco
+                campo = 'preco'
             elif estoque:
                 if estoque < 0:
                     return Response({'error': 'Dados inválidos', 'message': 'Estoque inválido'}, status=status.HTTP_400_BAD_REQUEST)
                 produto.estoque = estoque
+                campo = 'estoque'
             elif desconto:
                 if desconto < 0 or desconto > 100:
                     return Response({'error': 'Dados inválidos', 'message': 'Desconto inválido'}, status=status.HTTP_400_BAD_REQUEST)
                 produto.desconto = int(desconto)
+                campo = 'desconto'
+            elif faixas_estoque is not None:
+                if not isinstance(faixas_estoque, int) or isinstance(faixas_estoque, bool) or faixas_estoque < 0 or faixas_estoque > 64:
+                    return Response({'error': 'Dados inválidos', 'message': 'faixas_estoque deve ser um inteiro entre 0 e 64'}, status=status.HTTP_400_BAD_REQUEST)
+                produto.faixas_estoque = faixas_estoque
+                campo = 'faixas_estoque'
             else:
                 return Response({'error': 'Dados inválidos', 'message': 'Nenhum campo para atualizar'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            produto.save()
+
+            if campo == 'estoque' and (produto.faixas_estoque or produto.faixaestoque_set.exists()):
+                # Em produto quente o estoque informado é o total, redistribuído entre as faixas
+                definir_estoque(produto.pk, estoque)
+            else:
+                # Só o campo alterado, para não sobrescrever as reservas e baixas concorrentes
+                produto.save(update_fields=[campo])
+                if campo == 'faixas_estoque':
+                    rebalancear(produto.pk)
+
+            produto.refresh_from_db()
+            estoque, reservado = totais([produto])[produto.id]
 
             data = {
                 'id': produto.id,
+                'sku': produto.sku,
                 'nome': produto.nome,
                 'descricao': produto.descricao,
                 'preco': produto.preco,
-                'estoque': produto.estoque,
+                'estoque': estoque,
+                'disponivel': estoque - reservado,
                 'desconto': produto.desconto,
+                'preco_final': produto.preco_final,
             }
 
             return Response(data, status=status.HTTP_200_OK)
@@ -150,7 +320,10 @@ class ProdutoView(ViewSet):
 
         try:
             produto = Produto.objects.get(pk=pk)
-            produto.remove_estoque(produto.estoque) # Deixa o produto sem itens em estoque
+            if produto.faixas_estoque:
+                definir_estoque(produto.pk, 0)
+            else:
+                produto.remove_estoque(produto.estoque) # Deixa o produto sem itens em estoque
 
             return Response({'message': 'Produto declarado como em falta no estoque'}, status=status.HTTP_200_OK)
         
@@ -171,6 +344,9 @@ class ProdutoView(ViewSet):
 
             if percentual_desconto <= 0:
                 return Response({'error': 'Dados inválidos', 'message': 'O percentual de desconto deve ser maior que 0'}, status=status.HTTP_400_BAD_REQUEST)
+
+            if percentual_desconto > 100:
+                return Response({'error': 'Dados inválidos', 'message': 'O percentual de desconto deve ser no máximo 100'}, status=status.HTTP_400_BAD_REQUEST)
             
             percentual_desconto = Decimal(percentual_desconto)
 
@@ -179,4 +355,26 @@ class ProdutoView(ViewSet):
             return Response({'task_id': tarefa.id, 'message': 'Tarefa para atualização de preços enviada'}, status=status.HTTP_202_ACCEPTED)
         except Exception as e:
             return Response({'error': 'Erro ao atualizar preços', 'message': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
+
+    def status_desconto(self, request, task_id=None):
+        """
+        Retorna o andamento de uma tarefa de desconto
+        """
+
+        tarefa = atualizar_desconto.AsyncResult(task_id)
+        data = {'task_id': task_id, 'status': tarefa.state}
+
+        if tarefa.state == 'PROGRESS' or tarefa.successful():
+            data['processados'] = tarefa.info.get('processados')
+            data['total'] = tarefa.info.get('total')
+        elif tarefa.failed():
+            data['message'] = str(tarefa.info)
+
+        return Response(data, status=status.HTTP_200_OK)
+
+    def estatisticas_cache(self, request):
+        """
+        Retorna os acertos e falhas do cache de produtos
+        """
+
+        return Response(cache_produtos.estatisticas(), status=status.HTTP_200_OK)
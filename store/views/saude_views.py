@@ -0,0 +1,51 @@
+import logging
+import time
+from django.core.cache import cache
+from django.db import connection, DatabaseError
+from rest_framework.response import Response
+from rest_framework.viewsets import ViewSet
+from rest_framework.permissions import AllowAny
+from rest_framework import status
+
+INICIO_PROCESSO = time.time()
+
+logger = logging.getLogger(__name__)
+
+
+class SaudeView(ViewSet):
+    """
+    Health check para o balanceador/orquestrador: banco e cache respondendo
+    """
+
+    permission_classes = [AllowAny]
+
+    def list(self, request):
+        verificacoes = {}
+
+        # A rota é pública: o motivo da falha (que pode ter host e usuário) só vai para o log
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            verificacoes['banco'] = 'ok'
+        except DatabaseError:
+            logger.exception('Health check: banco fora do ar')
+            verificacoes['banco'] = 'erro'
+
+        try:
+            cache.set('store:saude', 1, timeout=10)
+            if cache.get('store:saude') == 1:
+                verificacoes['cache'] = 'ok'
+            else:
+                logger.error('Health check: valor gravado não foi encontrado no cache')
+                verificacoes['cache'] = 'erro'
+        except Exception:
+            logger.exception('Health check: cache fora do ar')
+            verificacoes['cache'] = 'erro'
+
+        saudavel = all(valor == 'ok' for valor in verificacoes.values())
+        data = {
+            'status': 'ok' if saudavel else 'erro',
+            **verificacoes,
+            'tempo_no_ar': round(time.time() - INICIO_PROCESSO, 1),
+        }
+        return Response(data, status=status.HTTP_200_OK if saudavel else status.HTTP_503_SERVICE_UNAVAILABLE)